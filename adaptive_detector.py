@@ -0,0 +1,109 @@
+import time
+import cv2
+from frame_source import as_dual_frame
+
+
+def _expand(box, margin, width, height):
+    # (x, y, w, h) grown by `margin` of its size on every side, clipped to the frame
+    x, y, w, h = box
+    mx, my = int(w * margin), int(h * margin)
+    x0, y0 = max(0, x - mx), max(0, y - my)
+    x1, y1 = min(width, x + w + mx), min(height, y + h + my)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _merge_rois(rois):
+    # Union overlapping ROIs until none overlap, so no pixel is scanned twice
+    rois = list(rois)
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        while rois:
+            x, y, w, h = rois.pop()
+            for i, (ox, oy, ow, oh) in enumerate(out):
+                if x < ox + ow and ox < x + w and y < oy + oh and oy < y + h:
+                    nx, ny = min(x, ox), min(y, oy)
+                    out[i] = (nx, ny, max(x + w, ox + ow) - nx, max(y + h, oy + oh) - ny)
+                    merged = True
+                    break
+            else:
+                out.append((x, y, w, h))
+        rois = out
+    return rois
+
+
+def _iou(a, b):
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    union = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class AdaptiveFaceDetector:
+    def __init__(self, detect, coarse_scale=0.25, fine_scale=0.5, min_scale=0.125, max_scale=1.0,
+                 target_latency=0.1, roi_margin=0.5, max_rois=4):
+        # detect(rgb) -> [(top, right, bottom, left)] is face_recognition.face_locations.
+        # A coarse pass covers the whole frame; ROIs around previous faces and
+        # motion get a second pass at fine_scale. Both scales follow the
+        # measured latency towards target_latency.
+        self.detect_fn = detect
+        self.coarse_scale = coarse_scale
+        self.fine_scale = fine_scale
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.target_latency = target_latency
+        self.roi_margin = roi_margin
+        self.max_rois = max_rois
+        self.previous = []
+        self.last_latency = None
+
+    def reset(self):
+        self.previous = []
+
+    def _detect_scaled(self, small, scale, offset_x=0, offset_y=0):
+        # `small` is already `scale` times the size of the main-frame region
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        # Map boxes from the scaled crop back to full-frame pixels
+        return [(int(top / scale) + offset_y, int(right / scale) + offset_x,
+                 int(bottom / scale) + offset_y, int(left / scale) + offset_x)
+                for top, right, bottom, left in self.detect_fn(rgb)]
+
+    def detect(self, frame, motion_regions=()):
+        start = time.time()
+        frame = as_dual_frame(frame)
+        height, width = frame.shape[:2]
+        # The coarse pass reads the lores stream when it is small enough
+        coarse = frame.downscaled(1 / self.coarse_scale)
+        boxes = self._detect_scaled(coarse, coarse.shape[1] / width)
+
+        if self.fine_scale > self.coarse_scale:
+            seeds = [(left, top, right - left, bottom - top) for top, right, bottom, left in self.previous]
+            seeds += list(motion_regions)
+            rois = _merge_rois(_expand(r, self.roi_margin, width, height) for r in seeds)
+            rois = sorted((r for r in rois if r[2] > 0 and r[3] > 0), key=lambda r: r[2] * r[3], reverse=True)
+            for x, y, w, h in rois[:self.max_rois]:
+                crop = frame.crop(x, y, w, h)
+                if crop is None:
+                    break
+                if self.fine_scale != 1.0:
+                    crop = cv2.resize(crop, (0, 0), fx=self.fine_scale, fy=self.fine_scale)
+                fine = self._detect_scaled(crop, self.fine_scale, x, y)
+                # Fine detections replace coarse ones of the same face
+                boxes = [b for b in boxes if all(_iou(b, f) < 0.3 for f in fine)] + fine
+
+        self.previous = boxes
+        self.last_latency = time.time() - start
+        self._adapt(self.last_latency)
+        return boxes
+
+    def _adapt(self, latency):
+        if latency > self.target_latency * 1.1:
+            factor = 0.9
+        elif latency < self.target_latency * 0.7:
+            factor = 1.05
+        else:
+            return
+        self.coarse_scale = min(max(self.coarse_scale * factor, self.min_scale), self.max_scale)
+        self.fine_scale = min(max(self.fine_scale * factor, self.coarse_scale), self.max_scale)
@@ -0,0 +1,181 @@
+import json
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    unit_id TEXT,
+    analyzer TEXT,
+    kind TEXT,
+    subject TEXT,
+    score REAL,
+    frame_ref TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_audit_events_timestamp ON audit_events (timestamp);
+CREATE TRIGGER IF NOT EXISTS audit_events_no_update BEFORE UPDATE ON audit_events
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS audit_events_no_delete BEFORE DELETE ON audit_events
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+"""
+
+
+class AuditLog:
+    def __init__(self, db_path="audit.db", unit_id=None, flush_interval=0.2, max_batch=2000, max_queue=20000,
+                 overflow="drop_oldest"):
+        # record() only appends to an in-memory queue; a writer thread inserts
+        # everything queued every flush_interval seconds in one transaction.
+        # The queue holds at most max_queue events. On overflow "drop_oldest"
+        # keeps the newest events and "drop_newest" keeps the oldest; either
+        # way the number lost is written to the log as an "overflow" event.
+        if overflow not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown overflow policy '{overflow}'")
+        self.db_path = db_path
+        self.unit_id = unit_id or socket.gethostname()
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._unreported_drops = 0
+        self._last_warning = 0.0
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # Flushes everything still queued before returning
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def record(self, analyzer, subject, kind="detection", score=None, frame_ref=None, details=None,
+               timestamp=None):
+        # Never blocks on I/O; returns False when the event was dropped
+        event = (time.time() if timestamp is None else timestamp, self.unit_id, analyzer, kind,
+                 None if subject is None else str(subject), score, None if frame_ref is None else str(frame_ref),
+                 json.dumps(details) if details is not None else None)
+        with self._lock:
+            self.recorded += 1
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                self._unreported_drops += 1
+                if self.overflow == "drop_newest":
+                    return False
+                self._queue.popleft()
+            self._queue.append(event)
+            wake = len(self._queue) >= self.max_batch
+        if wake:
+            self._wake.set()
+        return True
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(len(self._queue), self.max_batch)
+            batch = [self._queue.popleft() for _ in range(count)]
+            drops, self._unreported_drops = self._unreported_drops, 0
+        if drops:
+            if time.time() - self._last_warning > 10:
+                self._last_warning = time.time()
+                print(f"[INFO] Audit queue overflow: {self.stats()['dropped']} events dropped so far")
+            batch.append((time.time(), self.unit_id, "auditor", "overflow", None, float(drops), None,
+                          json.dumps({"policy": self.overflow})))
+        return batch
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        try:
+            while True:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                while True:
+                    batch = self._take_batch()
+                    if not batch:
+                        break
+                    try:
+                        with conn:
+                            conn.executemany(
+                                "INSERT INTO audit_events (timestamp, unit_id, analyzer, kind, subject, score, "
+                                "frame_ref, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                        with self._lock:
+                            self.written += len(batch)
+                            self.batches += 1
+                    except sqlite3.Error as e:
+                        print(f"[INFO] Audit write failed, {len(batch)} events lost: {e}")
+                        with self._lock:
+                            self.dropped += len(batch)
+                    if len(batch) < self.max_batch:
+                        break
+                if not self._running:
+                    with self._lock:
+                        if not self._queue and not self._unreported_drops:
+                            break
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {"recorded": self.recorded, "written": self.written, "dropped": self.dropped,
+                    "batches": self.batches, "queued": len(self._queue)}
+
+    def attach(self, events, analyzer):
+        # Logs an engine's "detection" and "match" events
+        events.subscribe("detection", lambda e: self.record(analyzer, e.get("subject"), "detection",
+                                                            e.get("score"), e.get("frame_ref"), e.get("details")))
+        events.subscribe("match", lambda info: self.record(analyzer, info.get("criminal_id") or
+                                                           info.get("plate_number"), "match", details=info))
+        return self
+
+
+def read_events(db_path="audit.db", since=None, analyzer=None, limit=100):
+    # Newest audit events first, as dicts
+    query = "SELECT * FROM audit_events WHERE 1=1"
+    params = []
+    if since is not None:
+        query += " AND timestamp >= ?"
+        params.append(since)
+    if analyzer:
+        query += " AND analyzer = ?"
+        params.append(analyzer)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute(query, params)]
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # python auditor.py [analyzer] [limit]: the newest events, oldest first
+    events = read_events(analyzer=sys.argv[1] if len(sys.argv) > 1 else None,
+                         limit=int(sys.argv[2]) if len(sys.argv) > 2 else 20)
+    for event in reversed(events):
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event["timestamp"]))
+        score = "" if event["score"] is None else f" {event['score']:.2f}"
+        print(f"{when} {event['unit_id']} {event['analyzer']} {event['kind']}: {event['subject']}{score}")
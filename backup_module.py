@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime
+
+DATABASES = ("criminals.db", "vehicles.db", "audit.db")
+FILES = ("encodings.pickle",)
+DIRECTORIES = ("dataset", "gallery")
+
+# Every stored chunk starts with one of these; photos barely compress, so
+# they are kept raw rather than paying zlib on every restore
+COMPRESSED = b"Z"
+RAW = b"R"
+
+
+class _KeepsRestarting(Exception):
+    pass
+
+
+def _stat_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BackupEngine:
+    def __init__(self, target="backups", root=".", databases=DATABASES, files=FILES, directories=DIRECTORIES,
+                 chunk_size=1 << 20, compress_level=6, pages=256, step_sleep=0.005, max_restarts=3):
+        # Snapshots are JSON manifests under target/snapshots; file contents
+        # live once in target/chunks, keyed by the sha256 of each chunk_size
+        # piece, so unchanged photos and database pages are never stored
+        # twice. A file whose size and mtime match the previous snapshot is
+        # not even read again. Databases are copied with SQLite's online
+        # backup API, `pages` pages at a time with a short sleep between
+        # steps so the running system can keep writing. A write from another
+        # connection restarts a stepped copy; after max_restarts the
+        # database is copied in a single step instead.
+        self.target = target
+        self.root = root
+        self.databases = databases
+        self.files = files
+        self.directories = directories
+        self.chunk_size = chunk_size
+        self.compress_level = compress_level
+        self.pages = pages
+        self.step_sleep = step_sleep
+        self.max_restarts = max_restarts
+        self.chunk_dir = os.path.join(target, "chunks")
+        self.snapshot_dir = os.path.join(target, "snapshots")
+        self.tmp_dir = os.path.join(target, "tmp")
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.files_scanned = 0
+        self.files_read = 0
+        self.chunks_written = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    # Chunk store
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def _put_chunk(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return digest
+        packed = zlib.compress(data, self.compress_level)
+        payload = COMPRESSED + packed if len(packed) < len(data) else RAW + data
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self.chunks_written += 1
+        self.bytes_written += len(payload)
+        return digest
+
+    def _get_chunk(self, digest):
+        with open(self._chunk_path(digest), "rb") as f:
+            payload = f.read()
+        data = zlib.decompress(payload[1:]) if payload[:1] == COMPRESSED else payload[1:]
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Backup chunk {digest} is corrupt")
+        return data
+
+    def _store_file(self, path):
+        # Streams the file through the chunk store; returns (sha256, chunks)
+        whole = hashlib.sha256()
+        chunks = []
+        with open(path, "rb") as f:
+            for data in iter(lambda: f.read(self.chunk_size), b""):
+                whole.update(data)
+                chunks.append(self._put_chunk(data))
+                self.bytes_read += len(data)
+        self.files_read += 1
+        return whole.hexdigest(), chunks
+
+    # Snapshots
+
+    def list_snapshots(self):
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.snapshot_dir) if name.endswith(".json"))
+
+    def load_snapshot(self, snapshot_id=None):
+        snapshots = self.list_snapshots()
+        if snapshot_id is None:
+            if not snapshots:
+                return None
+            snapshot_id = snapshots[-1]
+        with open(os.path.join(self.snapshot_dir, snapshot_id + ".json")) as f:
+            return json.load(f)
+
+    def _sources(self):
+        # (relative path, kind) of everything that currently exists
+        for name in self.databases:
+            if os.path.isfile(os.path.join(self.root, name)):
+                yield name, "sqlite"
+        for name in self.files:
+            if os.path.isfile(os.path.join(self.root, name)):
+                yield name, "file"
+        for directory in self.directories:
+            for dirpath, dirnames, filenames in os.walk(os.path.join(self.root, directory)):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    yield os.path.relpath(os.path.join(dirpath, filename), self.root), "file"
+
+    def _signature(self, path, kind):
+        signature = _stat_signature(path)
+        if kind == "sqlite" and os.path.exists(path + "-wal"):
+            # WAL databases change in the -wal file long before the main one
+            signature += _stat_signature(path + "-wal")
+        return signature
+
+    def _copy_database(self, path):
+        # Consistent copy of a live database into tmp_dir
+        copy_path = os.path.join(self.tmp_dir, os.path.basename(path) + ".backup")
+        source = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        dest = sqlite3.connect(copy_path)
+        progress = {"remaining": None, "restarts": 0}
+
+        def step(status, remaining, total):
+            if progress["remaining"] is not None and remaining > progress["remaining"]:
+                progress["restarts"] += 1
+                if progress["restarts"] > self.max_restarts:
+                    raise _KeepsRestarting()
+            progress["remaining"] = remaining
+            time.sleep(self.step_sleep)
+
+        try:
+            try:
+                # Each step holds the read lock only for `pages` pages
+                source.backup(dest, pages=self.pages, progress=step)
+            except _KeepsRestarting:
+                source.backup(dest)
+        finally:
+            dest.close()
+            source.close()
+        return copy_path
+
+    def backup(self):
+        # Writes a new snapshot and returns its manifest
+        self._reset_stats()
+        started = time.time()
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        previous = self.load_snapshot() or {"entries": {}}
+        entries = {}
+        for rel_path, kind in self._sources():
+            path = os.path.join(self.root, rel_path)
+            self.files_scanned += 1
+            try:
+                signature = self._signature(path, kind)
+                known = previous["entries"].get(rel_path)
+                if known and known["kind"] == kind and known["signature"] == signature:
+                    entries[rel_path] = known
+                    continue
+                if kind == "sqlite":
+                    copy_path = self._copy_database(path)
+                    try:
+                        digest, chunks = self._store_file(copy_path)
+                        size = os.path.getsize(copy_path)
+                    finally:
+                        os.remove(copy_path)
+                else:
+                    digest, chunks = self._store_file(path)
+                    size = signature[0]
+            except (OSError, sqlite3.Error) as e:
+                # A photo deleted mid-walk shouldn't cost the whole backup
+                print(f"[INFO] Skipping {rel_path} in backup: {e}")
+                continue
+            entries[rel_path] = {"kind": kind, "signature": signature, "size": size, "sha256": digest,
+                                 "chunks": chunks}
+
+        snapshot_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        suffix = 1
+        while os.path.exists(os.path.join(self.snapshot_dir, snapshot_id + ".json")):
+            suffix += 1
+            snapshot_id = datetime.now().strftime("%Y%m%d-%H%M%S") + f"-{suffix}"
+        manifest = {"id": snapshot_id, "created": time.time(), "entries": entries}
+        path = os.path.join(self.snapshot_dir, snapshot_id + ".json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+        print(f"[INFO] Backup {snapshot_id}: {len(entries)} entries, {self.files_read} read, "
+              f"{self.chunks_written} new chunks ({self.bytes_written / 1e6:.1f} MB) "
+              f"in {time.time() - started:.1f}s")
+        return manifest
+
+    def restore(self, snapshot_id=None, destination=".", paths=None):
+        # Restores the snapshot (latest by default), or only `paths` of it.
+        # Stop the LEO system first when restoring its databases in place.
+        manifest = self.load_snapshot(snapshot_id)
+        if manifest is None:
+            raise ValueError(f"No snapshots in '{self.target}'")
+        restored = 0
+        for rel_path, entry in manifest["entries"].items():
+            if paths is not None and rel_path not in paths:
+                continue
+            out_path = os.path.join(destination, rel_path)
+            os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+            whole = hashlib.sha256()
+            tmp_path = out_path + ".restore"
+            with open(tmp_path, "wb") as f:
+                for digest in entry["chunks"]:
+                    data = self._get_chunk(digest)
+                    whole.update(data)
+                    f.write(data)
+            if whole.hexdigest() != entry["sha256"]:
+                os.remove(tmp_path)
+                raise ValueError(f"Restored {rel_path} does not match its snapshot")
+            if entry["kind"] == "sqlite":
+                # A leftover WAL from the old database would be replayed
+                # into the restored one
+                for leftover in (out_path + "-wal", out_path + "-shm"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+            os.replace(tmp_path, out_path)
+            restored += 1
+        print(f"[INFO] Restored {restored} entries from snapshot {manifest['id']} to {destination}")
+        return restored
+
+    def prune(self, keep=7):
+        # Keeps the newest `keep` snapshots and deletes chunks none of them use
+        snapshots = self.list_snapshots()
+        for snapshot_id in snapshots[:-keep] if keep else snapshots:
+            os.remove(os.path.join(self.snapshot_dir, snapshot_id + ".json"))
+        live = set()
+        for snapshot_id in self.list_snapshots():
+            for entry in self.load_snapshot(snapshot_id)["entries"].values():
+                live.update(entry["chunks"])
+        removed = 0
+        if os.path.isdir(self.chunk_dir):
+            for dirpath, _, filenames in os.walk(self.chunk_dir):
+                for filename in filenames:
+                    if filename not in live:
+                        os.remove(os.path.join(dirpath, filename))
+                        removed += 1
+        print(f"[INFO] Pruned backups: {len(self.list_snapshots())} snapshots kept, {removed} chunks removed")
+        return removed
+
+
+if __name__ == "__main__":
+    # python backup_module.py backup [target]
+    # python backup_module.py restore [target] [snapshot] [destination]
+    # python backup_module.py list|prune [target]
+    command = sys.argv[1] if len(sys.argv) > 1 else "backup"
+    engine = BackupEngine(sys.argv[2] if len(sys.argv) > 2 else "backups")
+    if command == "backup":
+        engine.backup()
+    elif command == "restore":
+        engine.restore(sys.argv[3] if len(sys.argv) > 3 else None, sys.argv[4] if len(sys.argv) > 4 else ".")
+    elif command == "list":
+        for snapshot_id in engine.list_snapshots():
+            print(snapshot_id)
+    elif command == "prune":
+        engine.prune()
+    else:
+        print(f"Unknown command '{command}'")
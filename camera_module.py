@@ -1,15 +1,11 @@
 import cv2
 import time
 import threading
-from picamera2 import Picamera2
+from frame_source import PicameraSource
 
 class CameraModule:
-    def __init__(self, face_recognizer=None, output=None, resolution=(320, 240), format='RGB888'):
-        self.picam2 = Picamera2()
-        self.preview_config = self.picam2.create_preview_configuration(
-            main={"format": format, "size": resolution}
-        )
-        self.picam2.configure(self.preview_config)
+    def __init__(self, face_recognizer=None, output=None, resolution=(320, 240), format='RGB888', frame_source=None):
+        self.picam2 = frame_source or PicameraSource(main_size=resolution, scale=1, lores=False, format=format)
         self.window_name = "Pi Camera Feed"
         self.running = False
         self.thread = None
@@ -32,6 +28,8 @@ class CameraModule:
     def _stream(self):
         while self.running:
             frame = self.picam2.capture_array()
+            if frame is None:
+                break
 
             current_recognizer = self.face_recognizer  # get fresh reference
             if current_recognizer:
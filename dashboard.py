@@ -88,7 +88,7 @@ class DashboardApp:
     def __init__(self, root):
         self.root = root
         self.root.title("LEO Dashboard")
-        self.root.geometry("300x200")
+        self.root.geometry("300x300")
 
         self.name = None
         self.init_db()
@@ -103,6 +103,14 @@ class DashboardApp:
         self.train_button = tk.Button(root, text="Train Model", command=self.train_model_prompt)
         self.train_button.pack(pady=20)
 
+        self.cancel_train_button = tk.Button(root, text="Cancel Training", command=self.cancel_training,
+                                             state=tk.DISABLED)
+        self.cancel_train_button.pack()
+
+        self.train_status = tk.Label(root, text="")
+        self.train_status.pack(pady=5)
+        self.cancel_train_event = None
+
     def prompt_criminal_info(self):
         def on_form_submit(info):
             info["criminal_id"] = str(random.randint(100000, 999999))
@@ -135,12 +143,34 @@ class DashboardApp:
             threading.Thread(target=self.train_model_thread, daemon=True).start()
 
     def train_model_thread(self):
+        self.cancel_train_event = threading.Event()
+        self.root.after(0, self.train_button.config, {"state": tk.DISABLED})
+        self.root.after(0, self.cancel_train_button.config, {"state": tk.NORMAL})
         try:
-            train_face_recognition_model()
+            completed = train_face_recognition_model(progress_callback=self.on_train_progress,
+                                                     cancel_event=self.cancel_train_event)
         except Exception as e:
             messagebox.showerror("Error", f"Training failed: {e}")
         else:
-            messagebox.showinfo("Done", "Model training completed.")
+            if completed:
+                messagebox.showinfo("Done", "Model training completed.")
+            else:
+                messagebox.showinfo("Cancelled", "Model training was cancelled.")
+        finally:
+            self.root.after(0, self.train_button.config, {"state": tk.NORMAL})
+            self.root.after(0, self.cancel_train_button.config, {"state": tk.DISABLED})
+
+    def on_train_progress(self, progress):
+        # Called from the training thread; hand the update to the Tk loop
+        eta = f"{progress['eta']:.0f}s" if progress["eta"] is not None else "?"
+        text = (f"{progress['done']}/{progress['total']} images, {progress['images_per_sec']:.1f} img/s, "
+                f"ETA {eta}, {progress['failures']} failed")
+        self.root.after(0, self.train_status.config, {"text": text})
+
+    def cancel_training(self):
+        if self.cancel_train_event:
+            self.cancel_train_event.set()
+            self.train_status.config(text="Cancelling...")
 
 
     def init_db(self):
@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CRIMINAL_FIELDS = ("id", "criminal_id", "name", "age", "description", "offence", "status")
+VEHICLE_FIELDS = ("id", "plate_number", "owner", "make", "model", "status")
+
+
+class RecordStore:
+    def __init__(self, db_path, table, key_column, fields, cache_size=1024, reopen_interval=1.0):
+        # Keyed single-row lookups for the recognition loops. Every thread
+        # keeps one read-only connection with the query prepared once; found
+        # and missing keys are kept in an LRU that is emptied whenever
+        # PRAGMA data_version reports a commit from another connection
+        # (dashboard, training app). A database file replaced on disk is
+        # noticed within reopen_interval seconds.
+        self.db_path = db_path
+        self.table = table
+        self.key_column = key_column
+        self.fields = tuple(fields)
+        self.cache_size = cache_size
+        self.reopen_interval = reopen_interval
+        self.query = f"SELECT * FROM {table} WHERE {key_column} = ?"
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generation = 0
+        self._indexed = False
+
+    def _ensure_index(self):
+        # Lookups by a non-unique column would scan the table on every miss.
+        # A UNIQUE column already has sqlite's automatic index, so the schema
+        # is only touched when no index starts with the key column.
+        self._indexed = True
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=1)
+            try:
+                for index in conn.execute(f"PRAGMA index_list({self.table})").fetchall():
+                    columns = conn.execute(f"PRAGMA index_info({index[1]})").fetchall()
+                    if columns and columns[0][2] == self.key_column:
+                        return
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_{self.key_column} "
+                             f"ON {self.table} ({self.key_column})")
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _file_id(self):
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino
+
+    def _connection(self):
+        local = self._local
+        now = time.time()
+        conn = getattr(local, "conn", None)
+        if conn is not None and now - local.checked_at >= self.reopen_interval:
+            local.checked_at = now
+            if self._file_id() != local.file_id:
+                conn.close()
+                conn = local.conn = None
+                self.invalidate()
+        if conn is None:
+            if not os.path.exists(self.db_path):
+                return None
+            if not self._indexed:
+                self._ensure_index()
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True,
+                                   check_same_thread=False, cached_statements=16)
+            local.conn = conn
+            local.file_id = self._file_id()
+            local.checked_at = now
+            local.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        else:
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != local.data_version:
+                local.data_version = version
+                self.invalidate()
+        return conn
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+            self._generation += 1
+
+    def get(self, key):
+        conn = self._connection()
+        if conn is None:
+            return None
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                record = self._cache[key]
+                return dict(record) if record else None
+            generation = self._generation
+        self.misses += 1
+        row = conn.execute(self.query, (key,)).fetchone()
+        record = dict(zip(self.fields, row)) if row else None
+        with self._lock:
+            # Don't cache a row read just before an invalidation
+            if generation == self._generation:
+                self._cache[key] = record
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return dict(record) if record else None
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def record_store(db_path, table, key_column, fields, **kwargs):
+    # One shared store per database table, so every module reuses the same
+    # connections and cache
+    key = (os.path.abspath(db_path), table, key_column)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = RecordStore(db_path, table, key_column, fields, **kwargs)
+        return _stores[key]
+
+
+def criminal_records(db_path="criminals.db"):
+    return record_store(db_path, "criminals", "criminal_id", CRIMINAL_FIELDS)
+
+
+def vehicle_records(db_path="vehicles.db"):
+    return record_store(db_path, "vehicles", "plate_number", VEHICLE_FIELDS)
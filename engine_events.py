@@ -0,0 +1,32 @@
+import threading
+from collections import defaultdict
+
+
+class EventEmitter:
+    def __init__(self):
+        # Handlers run on the emitting thread, so they must be quick; a
+        # viewer or GUI hands the payload over to its own thread
+        self._handlers = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, event, handler):
+        with self._lock:
+            self._handlers[event].append(handler)
+        return handler
+
+    def unsubscribe(self, event, handler):
+        with self._lock:
+            if handler in self._handlers[event]:
+                self._handlers[event].remove(handler)
+
+    def has_subscribers(self, event):
+        return bool(self._handlers.get(event))
+
+    def emit(self, event, payload=None):
+        with self._lock:
+            handlers = list(self._handlers.get(event, ()))
+        for handler in handlers:
+            try:
+                handler(payload)
+            except Exception as e:
+                print(f"[INFO] {event} handler failed: {e}")
@@ -0,0 +1,159 @@
+import os
+import pickle
+import numpy as np
+from face_index import IVFIndex, encodings_fingerprint
+from gallery_store import GalleryStore
+
+
+def top_k(dists, k):
+    # Indices and distances of the k smallest entries per row, nearest first
+    k = min(k, dists.shape[1])
+    if k < dists.shape[1]:
+        idx = np.argpartition(dists, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(dists.shape[1]), dists.shape).copy()
+    top = np.take_along_axis(dists, idx, axis=1)
+    order = np.argsort(top, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+def _block_distances(queries, q_norms, encodings, sq_norms):
+    # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g, clipped against rounding below zero
+    sq = q_norms[:, None] + sq_norms[None, :] - 2.0 * (queries @ encodings.T)
+    np.maximum(sq, 0.0, out=sq)
+    return np.sqrt(sq)
+
+
+class FaceGallery:
+    def __init__(self, encodings, ids, tolerance=0.6, index=None, ann_threshold=50000, qualities=None,
+                 fingerprint=None):
+        # All known encodings live in one contiguous float32 matrix so a whole
+        # frame of faces can be matched with a single matrix product.
+        encodings = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, 128))
+        self._init_blocks([(encodings, np.einsum("ij,ij->i", encodings, encodings))], ids, qualities, fingerprint)
+        self.tolerance = tolerance
+        self.ann_threshold = ann_threshold
+        self.generation = None
+        self.index = None
+        if index is not None:
+            self.set_index(index)
+
+    def _init_blocks(self, blocks, ids, qualities, fingerprint):
+        # A gallery may span several matrices (base + delta segments of a
+        # GalleryStore) so memory-mapped segments are matched without copying.
+        self._blocks = blocks
+        self._offsets = np.cumsum([0] + [len(b[0]) for b in blocks])
+        self._encodings = blocks[0][0] if len(blocks) == 1 else None
+        self.ids = np.asarray(ids, dtype=object)
+        # Per-row prototype quality from compaction; raw galleries weigh every row equally
+        if qualities is None:
+            qualities = np.ones(len(self.ids))
+        self.qualities = np.asarray(qualities, dtype=np.float32)
+        self._fingerprint = fingerprint
+
+    @classmethod
+    def from_pickle(cls, encodings_path="encodings.pickle", index_path=None, tolerance=0.6,
+                    ann_threshold=50000, recall_target=0.95):
+        with open(encodings_path, "rb") as f:
+            data = pickle.loads(f.read())
+        gallery = cls(data["encodings"], data["ids"], tolerance=tolerance, ann_threshold=ann_threshold,
+                      qualities=data.get("qualities"))
+        if index_path and len(gallery) >= ann_threshold:
+            gallery.load_or_build_index(index_path, recall_target)
+        return gallery
+
+    @classmethod
+    def from_store(cls, store_path="gallery", index_path=None, tolerance=0.6, ann_threshold=50000,
+                   recall_target=0.95):
+        store = store_path if isinstance(store_path, GalleryStore) else GalleryStore(store_path)
+        blocks, ids, qualities = [], [], []
+        for encodings, sq_norms, seg_ids, seg_qualities in store.segments():
+            blocks.append((encodings, sq_norms))
+            ids.extend(seg_ids)
+            qualities.extend(seg_qualities)
+        if not blocks:
+            blocks = [(np.empty((0, 128), dtype=np.float32), np.empty(0, dtype=np.float32))]
+
+        gallery = cls.__new__(cls)
+        gallery._init_blocks(blocks, ids, qualities, store.manifest["fingerprint"])
+        gallery.tolerance = tolerance
+        gallery.ann_threshold = ann_threshold
+        gallery.generation = store.generation
+        gallery.index = None
+        if index_path and len(gallery) >= ann_threshold:
+            gallery.load_or_build_index(index_path, recall_target)
+        return gallery
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def encodings(self):
+        if self._encodings is None:
+            self._encodings = np.concatenate([b[0] for b in self._blocks])
+        return self._encodings
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = encodings_fingerprint(self.encodings)
+        return self._fingerprint
+
+    def set_index(self, index):
+        if not index.matches(self):
+            raise ValueError("ANN index was built for a different gallery")
+        self.index = index
+
+    def load_or_build_index(self, index_path, recall_target=0.95):
+        if os.path.exists(index_path):
+            index = IVFIndex.load(index_path)
+            if index.matches(self):
+                if index.recall is None or index.recall < recall_target:
+                    index.calibrate(self.encodings, recall_target)
+                    # Later startups reuse the new nprobe instead of recalibrating
+                    index.save(index_path)
+                self.index = index
+                return self.index
+            print(f"[INFO] ANN index '{index_path}' is stale, rebuilding...")
+        self.index = IVFIndex.build(self.encodings, recall_target=recall_target,
+                                    gallery_fingerprint=self.fingerprint)
+        self.index.save(index_path)
+        return self.index
+
+    def distances(self, face_encodings, rows=None):
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, 128)
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        if len(self._blocks) == 1:
+            encodings, sq_norms = self._blocks[0]
+            if rows is not None:
+                encodings, sq_norms = encodings[rows], sq_norms[rows]
+            return _block_distances(queries, q_norms, encodings, sq_norms)
+
+        if rows is None:
+            return np.hstack([_block_distances(queries, q_norms, e, n) for e, n in self._blocks])
+        rows = np.asarray(rows)
+        out = np.empty((len(queries), len(rows)), dtype=np.float32)
+        block_of = np.searchsorted(self._offsets, rows, side="right") - 1
+        for b, (encodings, sq_norms) in enumerate(self._blocks):
+            sel = np.flatnonzero(block_of == b)
+            if len(sel):
+                local = rows[sel] - self._offsets[b]
+                out[:, sel] = _block_distances(queries, q_norms, encodings[local], sq_norms[local])
+        return out
+
+    def search(self, face_encodings, k=1):
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, 128)
+        if len(queries) == 0 or len(self) == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+
+        # Brute force is exact and cheap enough below the threshold; above it
+        # the IVF shortlist is re-ranked exactly against the gallery rows.
+        if self.index is not None and len(self) >= self.ann_threshold:
+            return self.index.search(self, queries, k)
+        return top_k(self.distances(queries), k)
+
+    def match(self, face_encodings, k=1):
+        # One list of (criminal_id, distance) pairs per face, nearest first;
+        # ANN shortlists shorter than k come back padded with -1
+        idx, dists = self.search(face_encodings, k)
+        return [[(self.ids[i], float(dist)) for i, dist in zip(row, d) if i >= 0] for row, d in zip(idx, dists)]
@@ -0,0 +1,124 @@
+import os
+import hashlib
+import pickle
+import numpy as np
+
+
+def encodings_fingerprint(encodings):
+    return hashlib.sha1(np.ascontiguousarray(encodings, dtype=np.float32).tobytes()).hexdigest()
+
+
+def _sq_distances(a, b):
+    return (np.einsum("ij,ij->i", a, a)[:, None] + np.einsum("ij,ij->i", b, b)[None, :]
+            - 2.0 * (a @ b.T))
+
+
+def _assign(data, centroids, chunk=4096):
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk):
+        labels[start:start + chunk] = np.argmin(_sq_distances(data[start:start + chunk], centroids), axis=1)
+    return labels
+
+
+def _kmeans(data, nlist, iterations, rng):
+    sample = data[rng.choice(len(data), min(len(data), nlist * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty lists from random sample points so no list stays dead
+        if not filled.all():
+            centroids[~filled] = sample[rng.choice(len(sample), int((~filled).sum()))]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids, labels, fingerprint, nprobe=8, recall=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.fingerprint = fingerprint
+        self.nprobe = min(nprobe, len(self.centroids))
+        self.recall = recall
+        # Inverted lists as one permutation of gallery rows plus list offsets
+        self.order = np.argsort(self.labels, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(self.labels, minlength=len(self.centroids)))))
+
+    @classmethod
+    def build(cls, encodings, nlist=None, iterations=10, recall_target=0.95, seed=0, gallery_fingerprint=None):
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+        if nlist is None:
+            nlist = int(2 * np.sqrt(len(encodings)))
+        nlist = max(1, min(nlist, len(encodings)))
+        print(f"[INFO] Building ANN index: {len(encodings)} encodings, {nlist} lists...")
+
+        rng = np.random.default_rng(seed)
+        centroids = _kmeans(encodings, nlist, iterations, rng)
+        index = cls(centroids, _assign(encodings, centroids), gallery_fingerprint or encodings_fingerprint(encodings))
+        index.calibrate(encodings, recall_target, rng=rng)
+        print(f"[INFO] ANN index ready: nprobe={index.nprobe}, estimated recall={index.recall:.3f}")
+        return index
+
+    def calibrate(self, encodings, recall_target=0.95, sample=500, noise=0.35, rng=None):
+        # Probe just enough lists that the true nearest neighbour of a typical
+        # query lands in the shortlist for `recall_target` of the queries.
+        # Queries are gallery rows perturbed by roughly a same-person distance.
+        rng = rng or np.random.default_rng(0)
+        encodings = np.asarray(encodings, dtype=np.float32)
+        rows = rng.choice(len(encodings), min(sample, len(encodings)), replace=False)
+        queries = encodings[rows] + rng.normal(0, noise / np.sqrt(128), (len(rows), 128)).astype(np.float32)
+
+        true_nn = _assign(queries, encodings)
+        centroid_order = np.argsort(_sq_distances(queries, self.centroids), axis=1)
+        # Rank of the list holding the true neighbour in each query's probe order
+        ranks = np.argmax(centroid_order == self.labels[true_nn][:, None], axis=1)
+        recall_at = np.cumsum(np.bincount(ranks, minlength=len(self.centroids))) / len(rows)
+
+        self.nprobe = int(min(np.searchsorted(recall_at, recall_target) + 1, len(self.centroids)))
+        self.recall = float(recall_at[self.nprobe - 1])
+        return self.nprobe
+
+    def matches(self, gallery):
+        return len(gallery) == len(self.labels) and gallery.fingerprint == self.fingerprint
+
+    def search(self, gallery, queries, k=1, nprobe=None):
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_d = _sq_distances(queries, self.centroids)
+        if nprobe < len(self.centroids):
+            probes = np.argpartition(centroid_d, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(len(self.centroids)), centroid_d.shape)
+
+        out_idx = np.full((len(queries), k), -1, dtype=np.int64)
+        out_d = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for i, lists in enumerate(probes):
+            rows = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+            if not len(rows):
+                continue
+            # Exact re-rank of the shortlist against the gallery matrix
+            d = gallery.distances(queries[i], rows)[0]
+            kk = min(k, len(rows))
+            sel = np.argpartition(d, kk - 1)[:kk] if kk < len(rows) else np.arange(len(rows))
+            sel = sel[np.argsort(d[sel])]
+            out_idx[i, :kk] = rows[sel]
+            out_d[i, :kk] = d[sel]
+        return out_idx, out_d
+
+    def save(self, index_path):
+        data = {"centroids": self.centroids, "labels": self.labels, "fingerprint": self.fingerprint,
+                "nprobe": self.nprobe, "recall": self.recall}
+        # Training and the reloader both write this file; readers must never
+        # see it half-written
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pickle.dumps(data))
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path):
+        with open(index_path, "rb") as f:
+            data = pickle.loads(f.read())
+        return cls(data["centroids"], data["labels"], data["fingerprint"], data["nprobe"], data["recall"])
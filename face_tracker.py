@@ -0,0 +1,163 @@
+from collections import defaultdict
+import cv2
+import numpy as np
+
+
+def _iou(a, b):
+    # Boxes are (top, right, bottom, left) as returned by face_recognition
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _flow_shift(prev_gray, gray, box, min_points=4):
+    # Median Lucas-Kanade displacement of corners inside the box; None when the
+    # face can no longer be followed reliably.
+    top, right, bottom, left = box
+    mask = np.zeros_like(prev_gray)
+    mask[max(top, 0):bottom, max(left, 0):right] = 255
+    points = cv2.goodFeaturesToTrack(prev_gray, maxCorners=30, qualityLevel=0.01, minDistance=3, mask=mask)
+    if points is None or len(points) < min_points:
+        return None
+    moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, winSize=(15, 15), maxLevel=2)
+    good = status.ravel() == 1
+    if good.sum() < min_points:
+        return None
+    dx, dy = np.median((moved[good] - points[good]).reshape(-1, 2), axis=0)
+    return dx, dy, float(good.mean())
+
+
+class FaceTrack:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.encoding = None
+        self.confidence = 0.0
+        self.distance = None
+        self.votes = defaultdict(float)
+        self.reads = defaultdict(int)
+        self.pending = False
+        self.misses = 0
+        self.identity = "Unknown"
+
+    def vote(self, criminal_id, distance, tolerance, confirm_votes, vote_decay):
+        # Older reads fade so the track can still change its mind, but a
+        # single bad read no longer flips the label
+        for key in self.votes:
+            self.votes[key] *= vote_decay
+        if criminal_id == "Unknown":
+            self.votes["Unknown"] += 1.0
+        else:
+            self.votes[criminal_id] += 1.0 + max(0.0, tolerance - distance) / tolerance
+        self.reads[criminal_id] += 1
+        best = max(self.votes, key=self.votes.get)
+        # A known id needs confirm_votes reads of that same id; reads of
+        # other ids don't count towards it
+        confirmed = best == "Unknown" or self.reads[best] >= confirm_votes
+        self.identity = best if confirmed else "Unknown"
+        self.pending = not confirmed
+
+
+class FaceTracker:
+    def __init__(self, detect, encode, detect_every=5, reencode_below=0.5, confidence_decay=0.95,
+                 confirm_votes=2, vote_decay=0.8, match_iou=0.3, max_misses=2, box_scale=1):
+        # detect(rgb) -> boxes and encode(rgb, boxes) -> encodings are the
+        # face_recognition calls; everything in between is carried by flow.
+        # Boxes are kept box_scale times larger than the image passed to update().
+        # Confidence drops by confidence_decay times the flow quality each
+        # frame, so with clean flow a confirmed track is re-encoded about
+        # every 14 frames (0.95^14 < 0.5) rather than on every frame.
+        self.detect = detect
+        self.encode = encode
+        self.detect_every = detect_every
+        self.reencode_below = reencode_below
+        self.confidence_decay = confidence_decay
+        self.confirm_votes = confirm_votes
+        self.vote_decay = vote_decay
+        self.match_iou = match_iou
+        self.max_misses = max_misses
+        self.box_scale = box_scale
+        self.tracks = []
+        self.frame_index = 0
+        self.detector_calls = 0
+        self.encoder_calls = 0
+        self._next_id = 1
+        self._prev_gray = None
+
+    def reset(self):
+        self.tracks = []
+        self._prev_gray = None
+
+    def update(self, rgb, gallery):
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        height, width = gray.shape[0] * self.box_scale, gray.shape[1] * self.box_scale
+        lost = False
+
+        if self._prev_gray is not None and self._prev_gray.shape == gray.shape:
+            for track in self.tracks:
+                flow_box = tuple(int(v // self.box_scale) for v in track.box)
+                shift = _flow_shift(self._prev_gray, gray, flow_box)
+                if shift is None:
+                    lost = True
+                    continue
+                dx, dy, quality = shift
+                top, right, bottom, left = track.box
+                dx, dy = int(round(dx * self.box_scale)), int(round(dy * self.box_scale))
+                track.box = (min(max(top + dy, 0), height - 1), min(max(right + dx, 1), width),
+                             min(max(bottom + dy, 1), height), min(max(left + dx, 0), width - 1))
+                track.confidence *= self.confidence_decay * quality
+        self._prev_gray = gray
+
+        if lost or not self.tracks or self.frame_index % self.detect_every == 0:
+            self._associate(self.detect(rgb))
+        self.frame_index += 1
+
+        # Re-encode only new tracks, tracks whose confidence has decayed and
+        # tracks with a candidate id that is not yet confirmed by enough votes
+        visible = [t for t in self.tracks if t.misses == 0]
+        stale = [t for t in visible if t.encoding is None or t.confidence < self.reencode_below or t.pending]
+        if stale:
+            encodings = self.encode(rgb, [t.box for t in stale])
+            self.encoder_calls += len(stale)
+            matches = gallery.match(encodings, k=1)
+            for track, encoding, best in zip(stale, encodings, matches):
+                track.encoding = encoding
+                track.confidence = 1.0
+                track.distance = best[0][1] if best else None
+                if best and best[0][1] <= gallery.tolerance:
+                    criminal_id, distance = best[0]
+                else:
+                    criminal_id, distance = "Unknown", None
+                track.vote(criminal_id, distance, gallery.tolerance, self.confirm_votes, self.vote_decay)
+        return visible
+
+    def _associate(self, boxes):
+        self.detector_calls += 1
+        # Greedy IoU matching of fresh detections onto existing tracks
+        pairs = sorted(((_iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks) for bi, b in enumerate(boxes)),
+                       reverse=True)
+        used_tracks, used_boxes = set(), set()
+        for iou, ti, bi in pairs:
+            if iou < self.match_iou or ti in used_tracks or bi in used_boxes:
+                continue
+            self.tracks[ti].box = tuple(boxes[bi])
+            self.tracks[ti].misses = 0
+            used_tracks.add(ti)
+            used_boxes.add(bi)
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        for bi, box in enumerate(boxes):
+            if bi not in used_boxes:
+                survivors.append(FaceTrack(self._next_id, tuple(box)))
+                self._next_id += 1
+        self.tracks = survivors
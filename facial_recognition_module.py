@@ -1,18 +1,32 @@
-import sqlite3
 import face_recognition
 import cv2
-import numpy as np
-from picamera2 import Picamera2
+import threading
 import time
-import pickle
 import tkinter as tk
+import os
+from face_gallery import FaceGallery
+from gallery_reloader import GalleryReloader
+from frame_pipeline import FramePipeline
+from face_tracker import FaceTracker
+from motion_gate import MotionGate
+from adaptive_detector import AdaptiveFaceDetector
+from data_access import criminal_records
+from engine_events import EventEmitter
+from frame_viewer import FrameViewer
+from frame_bus import BusSubscription
+from frame_source import DualFrame, FrameSource, SoftwareDualSource, as_dual_frame, crop_box
 
 class FacialRecognitionModule:
-    def __init__(self, piCamera, encodings_path="encodings.pickle", cv_scaler=4):
+    def __init__(self, piCamera, encodings_path="encodings.pickle", cv_scaler=4,
+                 index_path="encodings.index", ann_threshold=50000, recall_target=0.95, gallery_path="gallery",
+                 reload_interval=2.0, pipelined=True, tracking=True, detect_every=5, motion_gating=True,
+                 refresh_interval=5.0, adaptive=False, target_latency=0.1, frame_source=None, headless=False,
+                 viewer_fps=10.0):
         self.cv_scaler = cv_scaler
         self.face_locations = []
         self.face_encodings = []
         self.face_names = []
+        self.face_ids = []
         self.frame_count = 0
         self.start_time = time.time()
         self.fps = 0
@@ -20,19 +34,78 @@ class FacialRecognitionModule:
         self.running = False
         self.matched_person_info = None
         self.root = None
+        self._gui_thread = None
         self.current_gui = None
         self.camera_started = False
+        self.encodings_path = encodings_path
+        self.gallery_path = gallery_path
+        self.index_path = index_path
+        self.ann_threshold = ann_threshold
+        self.recall_target = recall_target
+        self.records = criminal_records()
 
 
         print("[INFO] Loading encodings...")
-        with open(encodings_path, "rb") as f:
-            data = pickle.loads(f.read())
-        self.known_face_encodings = data["encodings"]
-        self.known_face_ids = data["ids"]
-        print(f"[INFO] Loaded {len(self.known_face_ids)} known faces")
+        self.gallery = self._load_gallery()
+        print(f"[INFO] Loaded {len(self.gallery)} known faces")
+
+        self.pipelined = pipelined
+        self.motion_gate = MotionGate(refresh_interval=refresh_interval) if motion_gating else None
+        self._last_analysis = None
+        self.adaptive_detector = None
+        if adaptive:
+            self.adaptive_detector = AdaptiveFaceDetector(face_recognition.face_locations,
+                                                          coarse_scale=1 / cv_scaler,
+                                                          target_latency=target_latency)
+        self._frame = None
+        self.tracker = None
+        if tracking:
+            self.tracker = FaceTracker(
+                lambda rgb: self._detect_faces(self._frame, rgb),
+                lambda rgb, boxes: self._encode_faces(self._frame, rgb, boxes),
+                detect_every=detect_every, box_scale=cv_scaler)
+        self.pipeline = None
+        self.last_latency = None
+
+        # "frame" and "match" events; with headless=True nothing subscribes
+        # to frames, so no drawing, window or Tk work happens at all
+        self.headless = headless
+        self.match_gui = not headless
+        self.events = EventEmitter()
+        self.viewer = None
+        if not headless:
+            self.viewer = FrameViewer("Video", self._render, fps=viewer_fps, on_quit=self._quit).attach(self.events)
+
+        # Picks up retrained galleries in the background; swapped in between frames
+        self.reloader = None
+        if reload_interval:
+            watch = [self.encodings_path]
+            if self.gallery_path:
+                watch.append(os.path.join(self.gallery_path, "manifest.json"))
+            self.reloader = GalleryReloader(self._load_gallery, watch, reload_interval)
 
         print("[INFO] Starting camera...")
         self.picam2 = piCamera
+        # Lores + lazy full-resolution frames; plain capture_array with a software resize otherwise.
+        # piCamera may itself be a FrameSource (webcam, video file, replay).
+        if frame_source is None:
+            frame_source = piCamera if isinstance(piCamera, FrameSource) else SoftwareDualSource(
+                self.picam2.capture_array, cv_scaler)
+        self.frame_source = frame_source
+
+    def _load_gallery(self):
+        if self.gallery_path and os.path.exists(os.path.join(self.gallery_path, "manifest.json")):
+            return FaceGallery.from_store(self.gallery_path, index_path=self.index_path,
+                                          ann_threshold=self.ann_threshold, recall_target=self.recall_target)
+        return FaceGallery.from_pickle(self.encodings_path, index_path=self.index_path,
+                                       ann_threshold=self.ann_threshold, recall_target=self.recall_target)
+
+    def _swap_gallery(self):
+        if self.reloader:
+            gallery = self.reloader.take()
+            if gallery is not None:
+                self.gallery = gallery
+                print(f"[INFO] Switched to new gallery with {len(gallery)} known faces")
 
     def _calculate_fps(self):
         self.frame_count += 1
@@ -43,23 +116,82 @@ class FacialRecognitionModule:
             self.start_time = time.time()
         return self.fps
 
+    def _analyze(self, frame):
+        self._swap_gallery()
+        # Unchanged scene: keep the last results instead of running dlib again
+        frame = as_dual_frame(frame, self.cv_scaler)
+        gate = self.motion_gate
+        if gate and self._last_analysis is not None and not gate.check(frame.lores, frame.captured_at):
+            return self._last_analysis
+        self._last_analysis = self._detect_and_match(frame)
+        return self._last_analysis
+
+    def _detect_faces(self, frame, rgb_small):
+        # Face boxes are always (top, right, bottom, left) in full-frame pixels
+        if self.adaptive_detector:
+            regions = self.motion_gate.motion_regions(frame.shape) if self.motion_gate else ()
+            return self.adaptive_detector.detect(frame, regions)
+        return [(top * self.cv_scaler, right * self.cv_scaler, bottom * self.cv_scaler, left * self.cv_scaler)
+                for top, right, bottom, left in face_recognition.face_locations(rgb_small)]
+
+    def _encode_faces(self, frame, rgb_small, boxes):
+        if not self.adaptive_detector:
+            small_boxes = [tuple(v // self.cv_scaler for v in box) for box in boxes]
+            return face_recognition.face_encodings(rgb_small, small_boxes, model='large')
+
+        # Faces found at higher resolution are encoded from a full-resolution
+        # crop around each face instead of the downscaled frame
+        encodings = []
+        for top, right, bottom, left in boxes:
+            crop, (x0, y0) = crop_box(frame, (top, right, bottom, left), margin=0.5)
+            if crop is None:
+                # Camera buffer already recycled; fall back to the lores frame
+                small_box = (top // self.cv_scaler, right // self.cv_scaler,
+                             bottom // self.cv_scaler, left // self.cv_scaler)
+                encodings.append(face_recognition.face_encodings(rgb_small, [small_box], model='large')[0])
+                continue
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+            found = face_recognition.face_encodings(crop, [(top - y0, right - x0, bottom - y0, left - x0)],
+                                                    model='large')
+            encodings.append(found[0])
+        return encodings
+
+    def _detect_and_match(self, frame):
+        self._frame = frame
+        # Detection works on the lores stream; no full-size resize or colour conversion
+        rgb_resized_frame = frame.rgb(self.cv_scaler)
+        if self.tracker:
+            # Detector every few frames, flow in between; ids come from per-track votes
+            tracks = self.tracker.update(rgb_resized_frame, self.gallery)
+            self._emit_detections(frame, [t.identity for t in tracks], [t.distance for t in tracks],
+                                  [t.track_id for t in tracks])
+            return [t.box for t in tracks], [t.encoding for t in tracks], [t.identity for t in tracks]
+        face_locations = self._detect_faces(frame, rgb_resized_frame)
+        face_encodings = self._encode_faces(frame, rgb_resized_frame, face_locations)
+        # Match every face in the frame against the gallery in one batch
+        matches = self.gallery.match(face_encodings, k=1)
+        distances = [best[0][1] if best else None for best in matches]
+        face_ids = [best[0][0] if best and best[0][1] <= self.gallery.tolerance else "Unknown" for best in matches]
+        self._emit_detections(frame, face_ids, distances)
+        return face_locations, face_encodings, face_ids
+
+    def _emit_detections(self, frame, face_ids, distances, track_ids=None):
+        if not self.events.has_subscribers("detection"):
+            return
+        for i, (criminal_id, distance) in enumerate(zip(face_ids, distances)):
+            self.events.emit("detection", {"subject": criminal_id, "score": distance,
+                                           "frame_ref": frame.captured_at,
+                                           "details": {"track_id": track_ids[i]} if track_ids else None})
+
     def _process_frame(self, frame):
-        resized_frame = cv2.resize(frame, (0, 0), fx=(1/self.cv_scaler), fy=(1/self.cv_scaler))
-        rgb_resized_frame = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2RGB)
-        self.face_locations = face_recognition.face_locations(rgb_resized_frame)
-        self.face_encodings = face_recognition.face_encodings(rgb_resized_frame, self.face_locations, model='large')
-        self.face_ids = []
-        self.match_found = False
+        self.face_locations, self.face_encodings, self.face_ids = self._analyze(frame)
+        self._handle_matches()
+        return frame.main if isinstance(frame, DualFrame) else frame
 
-        for face_encoding in self.face_encodings:
-            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding)
-            criminal_id = "Unknown"
-            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            best_match_index = np.argmin(face_distances)
-            if matches[best_match_index]:
-                criminal_id = self.known_face_ids[best_match_index]
-            self.face_ids.append(criminal_id)
+    def _handle_matches(self):
+        self.match_found = False
 
+        for criminal_id in self.face_ids:
             if criminal_id != "Unknown":
                 person_info = self.get_person_info(criminal_id)
                 if person_info:
@@ -67,88 +199,147 @@ class FacialRecognitionModule:
                     self.matched_person_info = person_info
                     self.running = False
                     self.match_found = True
-                    # Show GUI with match
-                    cv2.destroyAllWindows()
-                    self.show_match_gui(person_info)
-                    
-                    
+                    self.events.emit("match", person_info)
                     break 
                 else:
                     print(f"[INFO] ID matched but no record in DB for {criminal_id}")
             else:
                 print("[INFO] Unknown face detected")
-        return frame
-
-    def _draw_results(self, frame):
-        for (top, right, bottom, left), criminal_id in zip(self.face_locations, self.face_ids):
-            top *= self.cv_scaler
-            right *= self.cv_scaler
-            bottom *= self.cv_scaler
-            left *= self.cv_scaler
 
+    def _draw_results(self, frame, face_locations=None, face_ids=None):
+        face_locations = self.face_locations if face_locations is None else face_locations
+        face_ids = self.face_ids if face_ids is None else face_ids
+        for (top, right, bottom, left), criminal_id in zip(face_locations, face_ids):
             cv2.rectangle(frame, (left, top), (right, bottom), (244, 42, 3), 3)
             cv2.rectangle(frame, (left -3, top - 35), (right+3, top), (244, 42, 3), cv2.FILLED)
             font = cv2.FONT_HERSHEY_DUPLEX
             cv2.putText(frame, criminal_id, (left + 6, top - 6), font, 1.0, (255, 255, 255), 1)
         return frame
 
-    def run(self):
-        if self.root is None:
-            self.root = tk.Tk()
-            self.root.withdraw()
-
-        screen_width = self.root.winfo_screenwidth()
-        screen_height = self.root.winfo_screenheight()
-
-        win_width = 1280
-        win_height = 720
+    def _render(self, frame, payload):
+        # Viewer thread: paints a frame event
+        self._draw_results(frame, payload["face_locations"], payload["face_ids"])
+        cv2.putText(frame, f"FPS: {payload['fps']:.1f}", (frame.shape[1] - 150, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        if payload["latency"] is not None:
+            cv2.putText(frame, f"Latency: {payload['latency'] * 1000:.0f} ms", (frame.shape[1] - 260, 65),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        return frame
 
-        win_x = (screen_width - win_width) // 2
-        win_y = (screen_height - win_height) // 2
+    def _quit(self):
+        self.running = False
 
-        cv2.namedWindow("Video", cv2.WINDOW_NORMAL)
-        cv2.resizeWindow("Video", win_width, win_height)
-        cv2.moveWindow("Video", win_x, win_y)
+    def _pump_gui(self):
+        # Keeps open match windows responsive; Tk may only be driven from
+        # the thread that created it
+        if self.root is not None and self._gui_thread is threading.current_thread():
+            self.root.update()
+
+    def _publish(self, frame, latency=None):
+        fps = self._calculate_fps()
+        # Touching frame.main may pull a full-resolution buffer; skip it when
+        # nobody is watching
+        if self.events.has_subscribers("frame"):
+            self.events.emit("frame", {"frame": frame.main if isinstance(frame, DualFrame) else frame,
+                                       "face_locations": self.face_locations, "face_ids": self.face_ids,
+                                       "latency": latency, "fps": fps})
 
+    def run(self):
         self.running = True
         if not self.camera_started:
             print("[INFO] Starting camera feed...")
             self.picam2.start()
             time.sleep(2)
             self.camera_started = True
-
+        if self.reloader:
+            self.reloader.start()
+        if self.tracker:
+            self.tracker.reset()
+        if self.motion_gate:
+            self.motion_gate.reset()
+        if self.adaptive_detector:
+            self.adaptive_detector.reset()
+        self._last_analysis = None
+        if self.viewer:
+            self.viewer.start()
+
+        try:
+            if self.pipelined:
+                self._run_pipelined()
+            else:
+                self._run_serial()
+        finally:
+            if self.viewer:
+                self.viewer.stop()
+            if isinstance(self.picam2, BusSubscription):
+                # A shared camera keeps running; just stop taking its frames
+                self.picam2.stop()
+                self.camera_started = False
+
+        # GUI work happens only once the hot loop has ended
+        if self.match_found and self.match_gui:
+            self.show_match_gui(self.matched_person_info)
+
+    def _run_serial(self):
         while self.running:
-            frame = self.picam2.capture_array()
-            processed_frame = self._process_frame(frame)
-
-            if self.match_found:  
+            frame = self.frame_source.capture()
+            if frame is None:
+                print("[INFO] Frame source exhausted")
                 break
+            self._process_frame(frame)
+            self._publish(frame)
+            self._pump_gui()
 
-            display_frame = self._draw_results(processed_frame)
-            current_fps = self._calculate_fps()
-            cv2.putText(display_frame, f"FPS: {current_fps:.1f}", (display_frame.shape[1] - 150, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            cv2.imshow('Video', display_frame)
-
-            if cv2.waitKey(1) == ord("q"):
+            if self.match_found:  
                 break
 
-            if self.root:
-                self.root.update()
-
-        # cv2.destroyAllWindows()
-        # self.picam2.stop()
+    def _run_pipelined(self):
+        # Capture and recognition run on their own threads. This thread
+        # handles the newest finished result and publishes the freshest
+        # captured frame with the latest overlay, so the preview keeps camera
+        # rate while dlib works.
+        pipeline = FramePipeline(self.frame_source.capture, self._analyze)
+        self.pipeline = pipeline
+        pipeline.start()
+        try:
+            while self.running and pipeline.running:
+                result = pipeline.poll_result()
+                if result is not None:
+                    self.face_locations, self.face_encodings, self.face_ids = result["value"]
+                    self.last_latency = result["latency"]
+                    self._handle_matches()
+                    if self.match_found:
+                        break
+
+                item = pipeline.next_frame(timeout=1.0)
+                self._pump_gui()
+                if item is None:
+                    continue
+                # Published straight away, while the camera still holds the
+                # buffer behind a lazily fetched main frame
+                self._publish(item["frame"], self.last_latency)
+        finally:
+            pipeline.stop()
+            latency = f"{pipeline.avg_latency * 1000:.0f} ms" if pipeline.avg_latency is not None else "n/a"
+            print(f"[INFO] Pipeline: {pipeline.frames_captured} captured, {pipeline.frames_analyzed} analyzed, "
+                  f"{pipeline.dropped_frames} dropped, {pipeline.analysis_errors} errors, avg latency {latency}")
 
     def stop_camera_and_windows(self):
         print("[INFO] Stopping camera feed...")
         self.running = False
+        if self.pipeline:
+            self.pipeline.stop()
+        if self.viewer:
+            self.viewer.stop()
         if self.camera_started:
+            self.frame_source.release_all()
             self.picam2.stop()
             self.camera_started = False
-        cv2.destroyAllWindows()
 
     def stop(self):
         self.stop_camera_and_windows()
+        if self.reloader:
+            self.reloader.stop()
         # Close any open GUI windows and quit Tkinter
         if self.current_gui:
             self.current_gui.destroy()
@@ -159,27 +350,13 @@ class FacialRecognitionModule:
 
 
     def get_person_info(self, criminal_id):
-        conn = sqlite3.connect("criminals.db")
-        c = conn.cursor()
-        c.execute("SELECT * FROM criminals WHERE criminal_id = ?", (criminal_id,))
-        result = c.fetchone()
-        conn.close()
-        if result:
-            return {
-                "id": result[0],
-                "criminal_id": result[1],
-                "name": result[2],
-                "age": result[3],
-                "description": result[4],
-                "offence": result[5],
-                "status": result[6]
-            }
-        return None
+        return self.records.get(criminal_id)
 
     def show_match_gui(self, person_info):
         if self.root is None:
             self.root = tk.Tk()
             self.root.withdraw()
+            self._gui_thread = threading.current_thread()
 
         win = tk.Toplevel(self.root)
         win.title("Matched Person Info")
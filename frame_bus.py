@@ -0,0 +1,139 @@
+import threading
+import time
+from frame_queue import DropOldestQueue
+from frame_source import FrameSource
+
+
+class BusSubscription(FrameSource):
+    def __init__(self, bus, name, max_fps=None, skip="oldest", queue_size=1, needs_main=False):
+        # A FrameSource fed by the bus, so an analyzer's existing capture loop
+        # runs unchanged on top of it. Frames are only delivered while the
+        # subscription is started, at most max_fps per second. skip="oldest"
+        # replaces a frame the analyzer has not picked up yet with the new
+        # one; skip="newest" keeps the waiting frame and drops the new one.
+        # A lazily fetched main frame is gone once the camera has moved a few
+        # frames on, so with needs_main the bus fetches it before delivery.
+        super().__init__()
+        self.bus = bus
+        self.name = name
+        self.max_fps = max_fps
+        self.skip = skip
+        self.needs_main = needs_main
+        self.scale = bus.source.scale
+        self.active = False
+        self.delivered = 0
+        self.consumed = 0
+        self.skipped_budget = 0
+        self.skipped_busy = 0
+        self._queue = DropOldestQueue(queue_size)
+        self._next_due = 0.0
+
+    def start(self):
+        if not self.active:
+            self._queue.reopen()
+            self._next_due = 0.0
+            self.active = True
+        self.bus.start()
+
+    def stop(self):
+        # Only this analyzer stops; the camera keeps serving the others
+        self.active = False
+        self._queue.close()
+
+    def _accepts(self, now):
+        # Whether the frame captured at `now` goes to this subscription
+        if not self.active:
+            return False
+        if self.max_fps:
+            if now < self._next_due:
+                self.skipped_budget += 1
+                return False
+            # Deliveries follow a fixed schedule so the rate holds even when
+            # camera frames don't line up with it; a stall earns no burst
+            interval = 1.0 / self.max_fps
+            self._next_due = max(self._next_due, now - interval) + interval
+        if self.skip == "newest" and self._queue.full():
+            self.skipped_busy += 1
+            return False
+        return True
+
+    def _deliver(self, frame):
+        self.delivered += 1
+        self._queue.put(frame)
+
+    def capture(self):
+        # Blocks until the bus delivers; None once stopped or the source ended
+        while self.active:
+            frame = self._queue.get(timeout=0.5)
+            if frame is not None:
+                self.consumed += 1
+                return frame
+            if not self.bus.running:
+                return None
+        return None
+
+    def stats(self):
+        return {"delivered": self.delivered, "consumed": self.consumed, "dropped": self._queue.dropped,
+                "skipped_budget": self.skipped_budget, "skipped_busy": self.skipped_busy}
+
+
+class FrameBus:
+    def __init__(self, source):
+        # One capture thread reads `source` and hands every frame (the same
+        # DualFrame object, never a copy) to each active subscription. A slow
+        # analyzer only loses frames from its own queue.
+        self.source = source
+        self.subscriptions = []
+        self.running = False
+        self.frames_captured = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, name, max_fps=None, skip="oldest", needs_main=False):
+        subscription = BusSubscription(self, name, max_fps, skip, needs_main=needs_main)
+        with self._lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self.source.start()
+            self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        for subscription in self.subscriptions:
+            subscription.stop()
+        self.source.stop()
+
+    def _capture_loop(self):
+        while self.running:
+            if not any(s.active for s in self.subscriptions):
+                # Nobody is analysing: don't spin the camera pipeline
+                time.sleep(0.05)
+                continue
+            try:
+                frame = self.source.capture()
+            except Exception as e:
+                print(f"[INFO] Frame capture failed: {e}")
+                frame = None
+            if frame is None:
+                self.running = False
+                break
+            self.frames_captured += 1
+            now = time.time()
+            takers = [s for s in self.subscriptions if s._accepts(now)]
+            if any(s.needs_main for s in takers):
+                frame.main
+            for subscription in takers:
+                subscription._deliver(frame)
+
+    def stats(self):
+        return {s.name: s.stats() for s in self.subscriptions}
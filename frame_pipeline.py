@@ -0,0 +1,97 @@
+import threading
+import time
+from frame_queue import DropOldestQueue
+
+
+class FramePipeline:
+    def __init__(self, capture, analyze, queue_size=1):
+        # capture() -> frame runs on its own thread at camera rate;
+        # analyze(frame) -> result runs on a second thread as fast as the CPU
+        # allows. Both hand-offs drop the oldest entry when the consumer lags.
+        self.capture = capture
+        self.analyze = analyze
+        self.analysis_queue = DropOldestQueue(queue_size)
+        self.display_queue = DropOldestQueue(queue_size)
+        self.result_queue = DropOldestQueue(queue_size)
+        self.running = False
+        self.frames_captured = 0
+        self.frames_analyzed = 0
+        self.analysis_errors = 0
+        self.last_latency = None
+        self.avg_latency = None
+        self._threads = []
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        for q in (self.analysis_queue, self.display_queue, self.result_queue):
+            q.reopen()
+        self._threads = [threading.Thread(target=self._capture_loop, daemon=True),
+                         threading.Thread(target=self._analysis_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self.running = False
+        for q in (self.analysis_queue, self.display_queue, self.result_queue):
+            q.close()
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join()
+        self._threads = []
+
+    def _capture_loop(self):
+        while self.running:
+            try:
+                frame = self.capture()
+            except Exception as e:
+                print(f"[INFO] Frame capture failed: {e}")
+                self.running = False
+                break
+            if frame is None:
+                # Finite sources (files, replays) signal the end of the stream
+                self.running = False
+                break
+            self.frames_captured += 1
+            # Frames keep their source's timestamp (stream time for files and
+            # replays), so latency is measured from when the frame arrived here
+            received_at = time.time()
+            item = {"frame_id": self.frames_captured, "captured_at": getattr(frame, "captured_at", received_at),
+                    "received_at": received_at, "frame": frame}
+            self.analysis_queue.put(item)
+            self.display_queue.put(item)
+
+    def _analysis_loop(self):
+        while self.running:
+            item = self.analysis_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            try:
+                value = self.analyze(item["frame"])
+            except Exception as e:
+                # One bad frame must not end the analysis thread while the
+                # consumer keeps waiting for results
+                self.analysis_errors += 1
+                print(f"[INFO] Frame analysis failed: {e}")
+                continue
+            completed_at = time.time()
+            latency = completed_at - item["received_at"]
+            self.frames_analyzed += 1
+            self.last_latency = latency
+            self.avg_latency = latency if self.avg_latency is None else 0.9 * self.avg_latency + 0.1 * latency
+            self.result_queue.put({"frame_id": item["frame_id"], "captured_at": item["captured_at"],
+                                   "completed_at": completed_at, "latency": latency, "value": value,
+                                   "frame": item["frame"]})
+
+    def next_frame(self, timeout=1.0):
+        # Freshest captured frame for the preview
+        return self.display_queue.get(timeout)
+
+    def poll_result(self):
+        # Newest finished analysis since the last call, or None
+        return self.result_queue.get(timeout=0)
+
+    @property
+    def dropped_frames(self):
+        return self.analysis_queue.dropped
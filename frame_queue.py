@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import deque
+
+
+class DropOldestQueue:
+    def __init__(self, maxsize=1):
+        # put() never blocks the producer: when full, the oldest item is
+        # discarded so consumers always work on the freshest data.
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        # Returns None on timeout or once the queue is closed and drained
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._items and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._closed = False
+            self._items.clear()
+
+    def full(self):
+        return len(self._items) == self._items.maxlen
+
+    def __len__(self):
+        return len(self._items)
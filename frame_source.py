@@ -0,0 +1,489 @@
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+
+class DualFrame:
+    def __init__(self, lores, scale, main=None, fetch_main=None, captured_at=None):
+        # lores is a BGR frame `scale` times smaller than the main stream.
+        # The full-resolution main frame is only materialised when an
+        # analyzer asks for it (crops to encode or OCR, or the preview).
+        self.lores = lores
+        self.scale = scale
+        self.captured_at = captured_at if captured_at is not None else time.time()
+        self._main = main
+        self._fetch_main = fetch_main
+        self._scaled = {}
+        self._rgb = {}
+
+    @property
+    def shape(self):
+        if self._main is not None:
+            return self._main.shape
+        return (self.lores.shape[0] * self.scale, self.lores.shape[1] * self.scale) + self.lores.shape[2:]
+
+    @property
+    def main(self):
+        if self._main is None and self._fetch_main is not None:
+            self._main = self._fetch_main()
+            self._fetch_main = None
+        return self._main
+
+    def _release(self):
+        # Called by the source once the underlying camera buffer is recycled
+        self._fetch_main = None
+
+    def downscaled(self, factor):
+        # BGR frame at 1/factor of main, derived from lores whenever possible
+        if factor == self.scale:
+            return self.lores
+        if factor not in self._scaled:
+            source, relative = (self.lores, self.scale / factor) if factor > self.scale else (self.main, 1 / factor)
+            self._scaled[factor] = cv2.resize(source, (0, 0), fx=relative, fy=relative, interpolation=cv2.INTER_AREA)
+        return self._scaled[factor]
+
+    def rgb(self, factor):
+        if factor not in self._rgb:
+            self._rgb[factor] = cv2.cvtColor(self.downscaled(factor), cv2.COLOR_BGR2RGB)
+        return self._rgb[factor]
+
+    def crop(self, x, y, w, h):
+        # Full-resolution region in main-frame pixels, or None once the
+        # camera buffer behind a lazily fetched frame has been recycled
+        main = self.main
+        if main is None:
+            return None
+        height, width = main.shape[:2]
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        x1, y1 = min(width, int(x + w)), min(height, int(y + h))
+        return main[y0:y1, x0:x1]
+
+
+def as_dual_frame(frame, scale=4):
+    if isinstance(frame, DualFrame):
+        return frame
+    lores = cv2.resize(frame, (0, 0), fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+    return DualFrame(lores, scale, main=frame)
+
+
+class FrameSource:
+    # Common interface of every camera, file and replay backend. capture()
+    # returns a DualFrame, or None once a finite source is exhausted.
+    # start/stop/capture_array mirror Picamera2 so a source can be handed to
+    # code written against the camera. stop() only pauses: the modules stop
+    # their source between scans and start it again for the next one.
+    # close() is the final shutdown.
+    scale = 2
+
+    def __init__(self, speed=0):
+        # speed=1.0 paces file sources in real time, 2.0 twice as fast and
+        # 0 as fast as frames can be produced
+        self.speed = speed
+        self._pace_origin = None
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.release_all()
+        self._pace_origin = None
+
+    def capture(self):
+        raise NotImplementedError
+
+    def capture_array(self):
+        frame = self.capture()
+        return None if frame is None else frame.main
+
+    def release_all(self):
+        pass
+
+    def close(self):
+        self.stop()
+
+    def _pace(self, stream_time):
+        if not self.speed:
+            return
+        if self._pace_origin is None:
+            self._pace_origin = (time.time(), stream_time)
+        wall_start, stream_start = self._pace_origin
+        delay = wall_start + (stream_time - stream_start) / self.speed - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def __iter__(self):
+        while True:
+            frame = self.capture()
+            if frame is None:
+                return
+            yield frame
+
+
+class SoftwareDualSource(FrameSource):
+    def __init__(self, capture, scale=4):
+        # Fallback for sources without a hardware lores stream: one resize
+        # per frame, shared by every analyzer that reads the frame
+        super().__init__()
+        self.capture_fn = capture
+        self.scale = scale
+
+    def capture(self):
+        frame = self.capture_fn()
+        return None if frame is None else as_dual_frame(frame, self.scale)
+
+
+class PicameraSource(FrameSource):
+    def __init__(self, picam2=None, main_size=(1280, 720), scale=2, lores=True, format='XRGB8888', hold=3,
+                 buffer_count=6):
+        # With lores=True the camera must have a "lores" stream `scale` times
+        # smaller than "main" (see lores_configuration). Up to `hold` camera
+        # requests stay un-released so recent frames can still pull
+        # main-stream crops.
+        super().__init__()
+        if picam2 is None:
+            from picamera2 import Picamera2
+            picam2 = Picamera2()
+            if lores:
+                config = lores_configuration(picam2, main_size, scale, buffer_count)
+            else:
+                config = picam2.create_preview_configuration(main={"format": format, "size": main_size})
+            picam2.configure(config)
+        self.picam2 = picam2
+        self.scale = scale
+        self.lores = lores
+        self.hold = hold
+        self.started = False
+        self._held = deque()
+        self._lock = threading.Lock()
+
+    def start(self):
+        if not self.started:
+            self.picam2.start()
+            self.started = True
+
+    def stop(self):
+        self.release_all()
+        if self.started:
+            self.picam2.stop()
+            self.started = False
+
+    def close(self):
+        # Frees the camera so another Picamera2 object can open it
+        self.stop()
+        self.picam2.close()
+
+    def capture(self):
+        if not self.lores:
+            return as_dual_frame(self.picam2.capture_array(), self.scale)
+
+        request = self.picam2.capture_request()
+        lores = request.make_array("lores")
+        # The Pi ISP only produces YUV420 on the lores stream
+        if lores.ndim == 2:
+            lores = cv2.cvtColor(lores, cv2.COLOR_YUV420p2BGR)
+        frame = DualFrame(lores, self.scale, fetch_main=lambda: self._make_main(request))
+        with self._lock:
+            self._held.append((request, frame))
+            while len(self._held) > self.hold:
+                old_request, old_frame = self._held.popleft()
+                old_frame._release()
+                old_request.release()
+        return frame
+
+    def _make_main(self, request):
+        with self._lock:
+            if not any(r is request for r, _ in self._held):
+                return None
+            return request.make_array("main")
+
+    def release_all(self):
+        with self._lock:
+            while self._held:
+                request, frame = self._held.popleft()
+                frame._release()
+                request.release()
+
+
+def lores_configuration(picam2, main_size=(1280, 720), scale=2, buffer_count=6):
+    lores_size = (main_size[0] // scale, main_size[1] // scale)
+    return picam2.create_preview_configuration(
+        main={"format": 'XRGB8888', "size": main_size},
+        lores={"format": 'YUV420', "size": lores_size},
+        buffer_count=buffer_count,
+    )
+
+
+class OpenCVSource(FrameSource):
+    def __init__(self, device=0, scale=2, size=(1280, 720)):
+        # Live V4L2 camera (USB webcams and the like) through OpenCV
+        super().__init__()
+        self.device = device
+        self.size = size
+        self.scale = scale
+        self.capture_device = None
+
+    def start(self):
+        if self.capture_device is None:
+            self.capture_device = cv2.VideoCapture(self.device, cv2.CAP_V4L2)
+            if self.size:
+                self.capture_device.set(cv2.CAP_PROP_FRAME_WIDTH, self.size[0])
+                self.capture_device.set(cv2.CAP_PROP_FRAME_HEIGHT, self.size[1])
+            if not self.capture_device.isOpened():
+                raise RuntimeError(f"Could not open video device {self.device}")
+
+    def stop(self):
+        if self.capture_device is not None:
+            self.capture_device.release()
+            self.capture_device = None
+
+    def capture(self):
+        self.start()
+        ok, frame = self.capture_device.read()
+        return as_dual_frame(frame, self.scale) if ok else None
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, scale=2, speed=0, loop=False):
+        # Timestamps come from the frame index and the file's frame rate, so
+        # a replay yields the same frames and times however fast it runs
+        super().__init__(speed)
+        self.path = path
+        self.scale = scale
+        self.loop = loop
+        self.capture_device = None
+        self.fps = None
+        self.index = 0
+
+    def start(self):
+        # Reopening after stop() resumes at the frame where the file was left
+        if self.capture_device is None:
+            self.capture_device = cv2.VideoCapture(self.path)
+            if not self.capture_device.isOpened():
+                raise RuntimeError(f"Could not open video file '{self.path}'")
+            self.fps = self.capture_device.get(cv2.CAP_PROP_FPS) or 30.0
+            if self.index:
+                self.capture_device.set(cv2.CAP_PROP_POS_FRAMES, self.index)
+
+    def stop(self):
+        if self.capture_device is not None:
+            self.capture_device.release()
+            self.capture_device = None
+        self._pace_origin = None
+
+    def capture(self):
+        self.start()
+        ok, frame = self.capture_device.read()
+        if not ok and self.loop and self.index:
+            self.capture_device.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture_device.read()
+        if not ok:
+            return None
+        stream_time = self.index / self.fps
+        self.index += 1
+        self._pace(stream_time)
+        return DualFrame(_downscale(frame, self.scale), self.scale, main=frame, captured_at=stream_time)
+
+
+class ImageDirectorySource(FrameSource):
+    def __init__(self, path, scale=2, fps=10.0, speed=0, loop=False):
+        super().__init__(speed)
+        exts = (".jpg", ".jpeg", ".png", ".bmp")
+        self.paths = sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(exts))
+        self.scale = scale
+        self.fps = fps
+        self.loop = loop
+        self.index = 0
+
+    def capture(self):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return None
+            self.index = 0
+            self._pace_origin = None
+        frame = cv2.imread(self.paths[self.index])
+        stream_time = self.index / self.fps
+        self.index += 1
+        self._pace(stream_time)
+        return DualFrame(_downscale(frame, self.scale), self.scale, main=frame, captured_at=stream_time)
+
+
+class SyntheticSource(FrameSource):
+    def __init__(self, size=(1280, 720), scale=2, fps=30.0, frames=None, seed=0, speed=0, plate_text="ABC123"):
+        # Deterministic test pattern: frame i depends only on i and the seed.
+        # A plate-like box and a face-sized blob drift across a noisy scene.
+        super().__init__(speed)
+        self.size = size
+        self.scale = scale
+        self.fps = fps
+        self.frames = frames
+        self.seed = seed
+        self.plate_text = plate_text
+        self.index = 0
+        rng = np.random.default_rng(seed)
+        width, height = size
+        gradient = np.linspace(40, 120, width, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 6, (height, width, 1)).astype(np.float32)
+        self._background = np.clip(gradient + noise, 0, 255).astype(np.uint8).repeat(3, axis=2)
+
+    def render(self, index):
+        width, height = self.size
+        frame = self._background.copy()
+        t = index / self.fps
+        px = int((0.1 + 0.35 * (1 + np.sin(0.5 * t))) * (width - 260))
+        py = int(0.65 * height)
+        cv2.rectangle(frame, (px, py), (px + 240, py + 60), (235, 235, 235), cv2.FILLED)
+        cv2.rectangle(frame, (px, py), (px + 240, py + 60), (20, 20, 20), 3)
+        cv2.putText(frame, self.plate_text, (px + 18, py + 45), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (10, 10, 10), 3)
+        fx = int((0.5 + 0.3 * np.cos(0.3 * t)) * width)
+        cv2.ellipse(frame, (fx, int(0.3 * height)), (60, 80), 0, 0, 360, (120, 160, 200), cv2.FILLED)
+        return frame
+
+    def capture(self):
+        if self.frames is not None and self.index >= self.frames:
+            return None
+        frame = self.render(self.index)
+        stream_time = self.index / self.fps
+        self.index += 1
+        self._pace(stream_time)
+        return DualFrame(_downscale(frame, self.scale), self.scale, main=frame, captured_at=stream_time)
+
+
+# Recording format: magic, length-prefixed JSON header, then per frame a
+# (timestamp float64, JPEG length uint32) record followed by the JPEG bytes
+RECORDING_MAGIC = b"LEOREC01"
+RECORD = struct.Struct("<dI")
+
+
+class FrameRecorder:
+    def __init__(self, path, quality=90, metadata=None):
+        self.path = path
+        self.quality = quality
+        self.frames = 0
+        self._file = open(path, "wb")
+        header = json.dumps(dict(metadata or {}, version=1, created=time.time())).encode()
+        self._file.write(RECORDING_MAGIC + struct.pack("<I", len(header)) + header)
+
+    def write(self, frame, timestamp=None):
+        if isinstance(frame, DualFrame):
+            timestamp = frame.captured_at if timestamp is None else timestamp
+            frame = frame.main
+        if frame is None:
+            return
+        if frame.ndim == 3 and frame.shape[2] == 4:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        self._file.write(RECORD.pack(time.time() if timestamp is None else timestamp, len(jpeg)))
+        self._file.write(jpeg.tobytes())
+        self.frames += 1
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class RecordingSource(FrameSource):
+    def __init__(self, source, path, quality=90):
+        # Passes frames through from `source` while saving them for replay
+        super().__init__()
+        self.source = source
+        self.scale = source.scale
+        self.recorder = FrameRecorder(path, quality, {"scale": source.scale})
+
+    def start(self):
+        self.source.start()
+
+    def stop(self):
+        # The recording stays open for the next start()
+        self.source.stop()
+        self.recorder.flush()
+
+    def close(self):
+        self.source.close()
+        self.recorder.close()
+
+    def capture(self):
+        frame = self.source.capture()
+        if frame is not None:
+            self.recorder.write(frame)
+        return frame
+
+    def release_all(self):
+        self.source.release_all()
+
+
+class ReplaySource(FrameSource):
+    def __init__(self, path, scale=None, speed=0, loop=False):
+        # Frames keep their recorded timestamps; speed only changes pacing
+        super().__init__(speed)
+        self.path = path
+        self.loop = loop
+        self._file = open(path, "rb")
+        if self._file.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+            raise ValueError(f"'{path}' is not a LEO recording")
+        (length,) = struct.unpack("<I", self._file.read(4))
+        self.metadata = json.loads(self._file.read(length))
+        self._data_start = self._file.tell()
+        self.scale = scale or self.metadata.get("scale", 2)
+
+    def capture(self):
+        record = self._file.read(RECORD.size)
+        if len(record) < RECORD.size and self.loop:
+            self._file.seek(self._data_start)
+            self._pace_origin = None
+            record = self._file.read(RECORD.size)
+        if len(record) < RECORD.size:
+            return None
+        timestamp, length = RECORD.unpack(record)
+        frame = cv2.imdecode(np.frombuffer(self._file.read(length), dtype=np.uint8), cv2.IMREAD_COLOR)
+        self._pace(timestamp)
+        return DualFrame(_downscale(frame, self.scale), self.scale, main=frame, captured_at=timestamp)
+
+    def stop(self):
+        # Pausing keeps the position; the next start() resumes from there
+        self._pace_origin = None
+
+    def close(self):
+        self._file.close()
+
+
+def _downscale(frame, scale):
+    return cv2.resize(frame, (0, 0), fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+
+
+def open_frame_source(spec="picamera", **kwargs):
+    # "picamera", "v4l2:0", "video:clip.mp4", "images:dir", "synthetic" or
+    # "replay:session.leorec"; LEO_SOURCE picks one for the apps
+    kind, _, arg = spec.partition(":")
+    if kind == "picamera":
+        return PicameraSource(**kwargs)
+    if kind == "v4l2":
+        return OpenCVSource(int(arg) if arg.isdigit() else (arg or 0), **kwargs)
+    if kind == "video":
+        return VideoFileSource(arg, **kwargs)
+    if kind == "images":
+        return ImageDirectorySource(arg, **kwargs)
+    if kind == "synthetic":
+        return SyntheticSource(**kwargs)
+    if kind == "replay":
+        return ReplaySource(arg, **kwargs)
+    raise ValueError(f"Unknown frame source '{spec}'")
+
+
+def crop_box(frame, box, margin=0.0):
+    # (top, right, bottom, left) box in main pixels -> full-resolution crop and its origin
+    top, right, bottom, left = box
+    m = int((bottom - top) * margin)
+    x0, y0 = max(0, left - m), max(0, top - m)
+    return frame.crop(x0, y0, right + m - x0, bottom + m - y0), (x0, y0)
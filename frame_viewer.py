@@ -0,0 +1,130 @@
+import threading
+import time
+import cv2
+from frame_queue import DropOldestQueue
+
+
+class FrameViewer:
+    def __init__(self, window_name, draw, fps=10.0, size=(1280, 720), on_quit=None):
+        # Renders the newest "frame" event of an engine at no more than
+        # `fps`; draw(frame, overlay) paints a copy of the frame. Frames
+        # arriving faster than that are simply dropped. Every started viewer
+        # is drawn by the one shared render thread.
+        self.window_name = window_name
+        self.draw = draw
+        self.fps = fps
+        self.size = size
+        self.on_quit = on_quit
+        self.frames_shown = 0
+        self._latest = DropOldestQueue(1)
+        self._closed = threading.Event()
+        self._closed.set()
+        self._next_due = 0.0
+        self._view_fps = 0.0
+        self._shown = 0
+        self._window_start = 0.0
+
+    def attach(self, events):
+        events.subscribe("frame", self._on_frame)
+        return self
+
+    def _on_frame(self, payload):
+        # Runs on the engine thread: only hands over references
+        self._latest.put(payload)
+
+    def start(self):
+        self._latest.reopen()
+        _renderer.add(self)
+
+    def stop(self):
+        self._latest.close()
+        _renderer.remove(self)
+
+    def _render(self, now):
+        if now < self._next_due:
+            return
+        payload = self._latest.get(timeout=0)
+        if payload is None or payload["frame"] is None:
+            return
+        self._next_due = now + 1.0 / self.fps
+        image = self.draw(payload["frame"].copy(), payload)
+        cv2.putText(image, f"View FPS: {self._view_fps:.1f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1,
+                    (0, 255, 0), 2)
+        cv2.imshow(self.window_name, image)
+        self.frames_shown += 1
+        self._shown += 1
+        if now - self._window_start > 1:
+            self._view_fps = self._shown / (now - self._window_start)
+            self._shown, self._window_start = 0, now
+
+
+class _SharedRenderer:
+    def __init__(self):
+        # HighGUI is not thread-safe, so one thread owns every window: it
+        # opens a window when its viewer starts, draws each viewer at that
+        # viewer's rate, reads the keyboard once per tick and closes the
+        # window again when the viewer stops. The thread ends once no
+        # viewer is left.
+        self._lock = threading.Lock()
+        self._viewers = []
+        self._open = []
+        self._thread = None
+
+    def add(self, viewer):
+        with self._lock:
+            if viewer in self._viewers:
+                return
+            viewer._closed.clear()
+            self._viewers.append(viewer)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def remove(self, viewer, timeout=2.0):
+        with self._lock:
+            if viewer in self._viewers:
+                self._viewers.remove(viewer)
+            if viewer not in self._open:
+                viewer._closed.set()
+            thread = self._thread
+        # Wait for the window to go, unless asked from inside a draw or quit
+        if thread is not threading.current_thread():
+            viewer._closed.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                viewers = list(self._viewers)
+                closing = [v for v in self._open if v not in viewers]
+                opening = [v for v in viewers if v not in self._open]
+                self._open = viewers
+                if not viewers and not closing:
+                    self._thread = None
+                    return
+            for viewer in closing:
+                cv2.destroyWindow(viewer.window_name)
+                cv2.waitKey(1)
+                viewer._closed.set()
+            for viewer in opening:
+                cv2.namedWindow(viewer.window_name, cv2.WINDOW_NORMAL)
+                cv2.resizeWindow(viewer.window_name, *viewer.size)
+                viewer._next_due = 0.0
+                viewer._shown, viewer._window_start = 0, time.time()
+            if not viewers:
+                continue
+
+            started = time.time()
+            for viewer in viewers:
+                try:
+                    viewer._render(started)
+                except Exception as e:
+                    print(f"[INFO] Drawing '{viewer.window_name}' failed: {e}")
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                for viewer in viewers:
+                    if viewer.on_quit:
+                        viewer.on_quit()
+            delay = min(viewer._next_due for viewer in viewers) - time.time()
+            time.sleep(min(max(delay, 0.01), 0.05))
+
+
+_renderer = _SharedRenderer()
@@ -0,0 +1,85 @@
+import os
+import pickle
+import sys
+from collections import defaultdict
+import numpy as np
+
+
+def _pairwise_distances(encodings):
+    sq = np.einsum("ij,ij->i", encodings, encodings)
+    d = sq[:, None] + sq[None, :] - 2.0 * (encodings @ encodings.T)
+    np.maximum(d, 0.0, out=d)
+    return np.sqrt(d)
+
+
+def _k_medoids(dists, max_prototypes, merge_distance, iterations=10):
+    # Farthest-point seeding from the overall medoid: keep adding the face that
+    # is worst covered until everything is within merge_distance of a medoid,
+    # so distinct poses get their own prototype and near-duplicates collapse.
+    medoids = [int(np.argmin(dists.sum(axis=1)))]
+    while len(medoids) < max_prototypes:
+        nearest = dists[:, medoids].min(axis=1)
+        farthest = int(np.argmax(nearest))
+        if nearest[farthest] <= merge_distance:
+            break
+        medoids.append(farthest)
+
+    medoids = np.array(medoids)
+    for _ in range(iterations):
+        labels = np.argmin(dists[:, medoids], axis=1)
+        updated = medoids.copy()
+        for c in range(len(medoids)):
+            members = np.flatnonzero(labels == c)
+            updated[c] = members[np.argmin(dists[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    return medoids, np.argmin(dists[:, medoids], axis=1)
+
+
+def compact_encodings(encodings, ids, max_prototypes=3, merge_distance=0.3):
+    by_id = defaultdict(list)
+    for encoding, criminal_id in zip(encodings, ids):
+        by_id[criminal_id].append(encoding)
+
+    prototypes = []
+    prototype_ids = []
+    qualities = []
+    for criminal_id, group in by_id.items():
+        group = np.asarray(group, dtype=np.float32)
+        medoids, labels = _k_medoids(_pairwise_distances(group), max_prototypes, merge_distance)
+        support = np.bincount(labels, minlength=len(medoids))
+        for c, m in enumerate(medoids):
+            prototypes.append(group[m])
+            prototype_ids.append(criminal_id)
+            # Share of this person's photos the prototype stands in for
+            qualities.append(float(support[c]) / len(group))
+
+    return prototypes, prototype_ids, qualities
+
+
+def compact_pickle(input_path="encodings.pickle", output_path="encodings.pickle", max_prototypes=3, merge_distance=0.3):
+    with open(input_path, "rb") as f:
+        data = pickle.loads(f.read())
+    if "qualities" in data:
+        print(f"[INFO] '{input_path}' is already compacted")
+        return data
+
+    prototypes, prototype_ids, qualities = compact_encodings(data["encodings"], data["ids"],
+                                                             max_prototypes, merge_distance)
+    compacted = {"encodings": prototypes, "ids": prototype_ids, "qualities": qualities,
+                 "raw_count": len(data["ids"])}
+    # Write-then-rename so a running recognizer never reads a half-written file
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pickle.dumps(compacted))
+    os.replace(tmp_path, output_path)
+    print(f"[INFO] Compacted {len(data['ids'])} encodings into {len(prototypes)} prototypes")
+    return compacted
+
+
+if __name__ == "__main__":
+    # python gallery_compaction.py [input pickle] [output pickle]
+    # Compacts an existing encodings pickle without retraining
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "encodings.pickle"
+    compact_pickle(input_path, sys.argv[2] if len(sys.argv) > 2 else input_path)
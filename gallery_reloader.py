@@ -0,0 +1,71 @@
+import os
+import threading
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class GalleryReloader:
+    def __init__(self, load_gallery, watch_paths, poll_interval=2.0):
+        # load_gallery() must return a fully built FaceGallery; watch_paths are
+        # the files whose change means a new gallery version was published.
+        self.load_gallery = load_gallery
+        self.watch_paths = watch_paths
+        self.poll_interval = poll_interval
+        self.version = self._version()
+        self.reloads = 0
+        self._pending = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _version(self):
+        return tuple(_stat_key(p) for p in self.watch_paths)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            version = self._version()
+            if version == self.version:
+                continue
+            try:
+                gallery = self.load_gallery()
+            except Exception as e:
+                # Most likely caught mid-write; the next poll retries
+                print(f"[INFO] Gallery reload failed, keeping current gallery: {e}")
+                continue
+            # Only publish if nothing changed while loading
+            if self._version() != version:
+                continue
+            with self._lock:
+                self._pending = gallery
+            self.version = version
+            print(f"[INFO] New gallery loaded in background ({len(gallery)} known faces)")
+
+    def take(self):
+        # Called by the capture loop between frames; returns the new gallery
+        # once and None otherwise.
+        if self._pending is None:
+            return None
+        with self._lock:
+            gallery, self._pending = self._pending, None
+        if gallery is not None:
+            self.reloads += 1
+        return gallery
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import pickle
+import struct
+import time
+import numpy as np
+
+
+# Segment file: 64-byte header, float32 encodings (rows x dim), float32 squared norms (rows)
+MAGIC = b"LEOGAL\x00\x01"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIII")
+HEADER_SIZE = 64
+DEFAULT_MODEL = {"encoder": "dlib_face_recognition_resnet_model_v1", "dim": 128, "dtype": "float32"}
+
+
+class GalleryStore:
+    def __init__(self, path="gallery"):
+        self.path = path
+        self.manifest_path = os.path.join(path, "manifest.json")
+        self.manifest = self._read_manifest()
+
+    def exists(self):
+        return self.manifest is not None
+
+    @property
+    def generation(self):
+        return self.manifest["generation"] if self.manifest else None
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported gallery format version {manifest.get('version')} in '{self.path}'")
+        return manifest
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        # The manifest swap is the commit point: readers see either the old
+        # set of segments or the new one, never a partially written segment.
+        os.replace(tmp_path, self.manifest_path)
+        self.manifest = manifest
+
+    def _write_segment(self, name, encodings, ids, qualities):
+        encodings = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, 128))
+        sq_norms = np.einsum("ij,ij->i", encodings, encodings).astype(np.float32)
+        if qualities is None:
+            qualities = np.ones(len(encodings))
+
+        with open(os.path.join(self.path, name + ".f32"), "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(encodings), encodings.shape[1]).ljust(HEADER_SIZE, b"\0"))
+            f.write(encodings.tobytes())
+            f.write(sq_norms.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(os.path.join(self.path, name + ".ids.json"), "w") as f:
+            json.dump({"ids": [str(i) for i in ids], "qualities": [float(q) for q in qualities]}, f)
+
+        digest = hashlib.sha1(encodings.tobytes()).hexdigest()
+        return {"name": name, "rows": len(encodings), "sha1": digest}
+
+    def write(self, encodings, ids, qualities=None, model=None, metadata=None):
+        # Full rewrite as a single base segment; old segments are removed once
+        # the new manifest is in place.
+        os.makedirs(self.path, exist_ok=True)
+        generation = (self.generation or 0) + 1
+        old_segments = self.manifest["segments"] if self.manifest else []
+
+        segment = self._write_segment(f"seg-{generation:06d}", encodings, ids, qualities)
+        self._write_manifest({
+            "format": "leo-gallery",
+            "version": FORMAT_VERSION,
+            "generation": generation,
+            "model": model or DEFAULT_MODEL,
+            "metadata": dict(metadata or {}, updated=time.time()),
+            "segments": [segment],
+            "fingerprint": hashlib.sha1(segment["sha1"].encode()).hexdigest(),
+        })
+        self._remove_segments(old_segments)
+
+    def append(self, encodings, ids, qualities=None):
+        # Delta segment: existing segment files are never rewritten
+        if not self.exists():
+            return self.write(encodings, ids, qualities)
+        if len(ids) == 0:
+            return
+        manifest = dict(self.manifest)
+        generation = manifest["generation"] + 1
+        segment = self._write_segment(f"seg-{generation:06d}", encodings, ids, qualities)
+        manifest["generation"] = generation
+        manifest["segments"] = manifest["segments"] + [segment]
+        manifest["fingerprint"] = hashlib.sha1((manifest["fingerprint"] + segment["sha1"]).encode()).hexdigest()
+        manifest["metadata"] = dict(manifest["metadata"], updated=time.time())
+        self._write_manifest(manifest)
+
+    def compact(self):
+        # Fold delta segments back into one base segment
+        if not self.exists() or len(self.manifest["segments"]) <= 1:
+            return
+        encodings, ids, qualities = self.read_all()
+        self.write(encodings, ids, qualities, self.manifest["model"], self.manifest["metadata"])
+
+    def sync(self, encodings, ids, qualities=None, model=None, metadata=None):
+        # Append only the rows of identities the store has not seen yet; any
+        # change to an existing identity falls back to a full rewrite.
+        if not self.exists():
+            return self.write(encodings, ids, qualities, model, metadata)
+        if qualities is None:
+            qualities = np.ones(len(ids))
+        old_encodings, old_ids, _ = self.read_all()
+        known = set(old_ids)
+        new_rows = [i for i, criminal_id in enumerate(ids) if criminal_id not in known]
+        old_rows = [i for i, criminal_id in enumerate(ids) if criminal_id in known]
+
+        unchanged = (len(old_rows) == len(old_ids)
+                     and [ids[i] for i in old_rows] == list(old_ids)
+                     and np.array_equal(np.asarray(encodings, dtype=np.float32)[old_rows].reshape(-1, 128),
+                                        old_encodings))
+        if not unchanged:
+            return self.write(encodings, ids, qualities, model, metadata)
+        self.append(np.asarray(encodings, dtype=np.float32)[new_rows].reshape(-1, 128),
+                    [ids[i] for i in new_rows], [qualities[i] for i in new_rows])
+
+    def _remove_segments(self, segments):
+        live = {s["name"] for s in self.manifest["segments"]}
+        for segment in segments:
+            if segment["name"] in live:
+                continue
+            for ext in (".f32", ".ids.json"):
+                try:
+                    os.remove(os.path.join(self.path, segment["name"] + ext))
+                except FileNotFoundError:
+                    pass
+
+    def segments(self):
+        # Memory-mapped (encodings, sq_norms, ids, qualities) per segment; the
+        # page cache is shared by every process that maps the same files.
+        for segment in self.manifest["segments"]:
+            data_path = os.path.join(self.path, segment["name"] + ".f32")
+            with open(data_path, "rb") as f:
+                magic, version, rows, dim = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != FORMAT_VERSION or rows != segment["rows"]:
+                raise ValueError(f"Corrupt gallery segment '{data_path}'")
+
+            encodings = np.memmap(data_path, dtype=np.float32, mode="r", offset=HEADER_SIZE, shape=(rows, dim))
+            sq_norms = np.memmap(data_path, dtype=np.float32, mode="r",
+                                 offset=HEADER_SIZE + rows * dim * 4, shape=(rows,))
+            with open(os.path.join(self.path, segment["name"] + ".ids.json")) as f:
+                sidecar = json.load(f)
+            yield encodings, sq_norms, sidecar["ids"], sidecar["qualities"]
+
+    def read_all(self):
+        encodings, ids, qualities = [], [], []
+        for seg_encodings, _, seg_ids, seg_qualities in self.segments():
+            encodings.append(np.asarray(seg_encodings))
+            ids.extend(seg_ids)
+            qualities.extend(seg_qualities)
+        if not encodings:
+            return np.empty((0, 128), dtype=np.float32), ids, qualities
+        return np.concatenate(encodings), ids, qualities
+
+
+def convert_pickle(pickle_path="encodings.pickle", store_path="gallery"):
+    with open(pickle_path, "rb") as f:
+        data = pickle.loads(f.read())
+    store = GalleryStore(store_path)
+    store.write(data["encodings"], data["ids"], data.get("qualities"),
+                metadata={"source": os.path.abspath(pickle_path), "raw_count": data.get("raw_count", len(data["ids"]))})
+    print(f"[INFO] Converted {len(data['ids'])} encodings from '{pickle_path}' to '{store_path}'")
+    return store
+
+
+if __name__ == "__main__":
+    convert_pickle()
@@ -1,7 +1,7 @@
 import cv2
 import os
 from datetime import datetime
-from picamera2 import Picamera2
+from frame_source import PicameraSource
 import time
 import random
 
@@ -18,12 +18,11 @@ def create_folder(id):
         os.makedirs(person_folder)
     return person_folder
 
-def capture_photos(id):
+def capture_photos(id, frame_source=None):
     folder = create_folder(id)
     
     # Initialize the camera
-    picam2 = Picamera2()
-    picam2.configure(picam2.create_preview_configuration(main={"format": 'XRGB8888', "size": (1280, 960)}))
+    picam2 = frame_source or PicameraSource(main_size=(1280, 960), scale=1, lores=False)
     picam2.start()
 
     # Allow camera to warm up
@@ -36,6 +35,8 @@ def capture_photos(id):
     while True:
         # Capture frame from Pi Camera
         frame = picam2.capture_array()
+        if frame is None:
+            break
         
         # Display the frame
         cv2.imshow('Capture', frame)
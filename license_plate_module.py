@@ -1,21 +1,75 @@
 import cv2
 import numpy as np
-import pytesseract
-from picamera2 import Picamera2
+import os
+import threading
 import time
-import sqlite3
 from PIL import Image, ImageTk
 import tkinter as tk
+from motion_gate import MotionGate
+from data_access import vehicle_records
+from plate_index import PlateIndex
+from ocr_service import OCRService
+from plate_reader import PlateReader, TemplateBank
+from plate_scoring import PlateCandidateScorer
+from plate_tracker import PlateTracker
+from plate_localizer import PlateLocalizer
+from engine_events import EventEmitter
+from frame_viewer import FrameViewer
+from frame_bus import BusSubscription
+from frame_source import FrameSource, SoftwareDualSource
 
 class BasicLicensePlateRecognition:
-    def __init__(self, piCamera):
+    def __init__(self, piCamera, motion_gating=True, refresh_interval=5.0, frame_source=None, detect_scale=2,
+                 fuzzy_match=True, max_plate_cost=0.5, ocr_workers=None, ocr_timeout=None, ocr_top_k=3,
+                 frame_budget=0.15, vectorized_localization=True, template_path="plate_templates.pickle",
+                 headless=False, viewer_fps=10.0):
         self.picam2 = piCamera
+        # Plates are localised on a frame detect_scale times smaller than main
+        # and only the candidate regions are read at full resolution
+        self.detect_scale = detect_scale
+        if frame_source is None:
+            frame_source = piCamera if isinstance(piCamera, FrameSource) else SoftwareDualSource(
+                self.picam2.capture_array, detect_scale)
+        self.frame_source = frame_source
+        self.records = vehicle_records()
+        self.max_plate_cost = max_plate_cost
+        # Standard plates are read by template matching; the rest of a frame's
+        # candidates are read together by persistent OCR workers. Only a bank
+        # learned from our own plates is trusted to skip Tesseract: the
+        # generic font bank misreads confidently.
+        self.plate_reader = None
+        if template_path and os.path.exists(template_path):
+            self.plate_reader = PlateReader(TemplateBank.load(template_path))
+        elif template_path:
+            print(f"[INFO] No plate templates at '{template_path}', all plates go to Tesseract")
+        self.ocr = OCRService(workers=ocr_workers, timeout=ocr_timeout, fast_reader=self.plate_reader)
+        # Only the best-scoring few candidates per frame are worth an OCR call
+        self.scorer = PlateCandidateScorer(top_k=ocr_top_k, budget=frame_budget)
+        self.plate_tracker = PlateTracker()
+        # Bulk morphology + component stats instead of the per-contour loop
+        self.localizer = PlateLocalizer() if vectorized_localization else None
+        # OCR reads are matched against the watchlist with a confusion-aware
+        # index; it loads in the background and exact lookups serve until then
+        self.plate_index = None
+        if fuzzy_match:
+            threading.Thread(target=self._load_plate_index, daemon=True).start()
         self.window_name = "License Plate Recognition"
         self.running = False
         self.matched_vehicle_info = None
+        self.plates = []
         self.root = None
+        self._gui_thread = None
         self.current_gui = None 
         self.camera_started = False
+        self.motion_gate = MotionGate(refresh_interval=refresh_interval) if motion_gating else None
+        # "frame" and "match" events; headless runs draw nothing and open no windows
+        self.headless = headless
+        self.match_gui = not headless
+        self.events = EventEmitter()
+        self.viewer = None
+        if not headless:
+            self.viewer = FrameViewer(self.window_name, self._render, fps=viewer_fps,
+                                      on_quit=self._quit).attach(self.events)
 
     def preprocess_frame(self, frame):
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
@@ -23,7 +77,9 @@ class BasicLicensePlateRecognition:
         edges = cv2.Canny(blur, 50, 150)
         return edges, gray
 
-    def find_plate_candidates(self, edges):
+    def find_plate_candidates(self, edges, scale=1):
+        # Boxes are returned in full-frame pixels; `scale` is how much smaller
+        # the edge map is than the full frame
         contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
         candidates = []
         for contour in contours:
@@ -31,90 +87,151 @@ class BasicLicensePlateRecognition:
             if len(approx) == 4:
                 x, y, w, h = cv2.boundingRect(approx)
                 aspect_ratio = w / float(h)
-                if 2 < aspect_ratio < 6 and w > 60 and h > 20:
-                    candidates.append((x, y, w, h))
+                if 2 < aspect_ratio < 6 and w * scale > 60 and h * scale > 20:
+                    candidates.append((x * scale, y * scale, w * scale, h * scale))
         return candidates
 
-    def recognize_plate_text(self, frame, candidates):
-        for (x, y, w, h) in candidates:
-            roi = frame[y:y+h, x:x+w]
-            gray_roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            _, thresh = cv2.threshold(gray_roi, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    def locate_plates(self, edges, gray):
+        if self.localizer is None:
+            return self.find_plate_candidates(edges, self.detect_scale)
+        return self.localizer.locate(gray, self.detect_scale)
 
-            text = pytesseract.image_to_string(thresh, config='--psm 7')
-            plate_number = ''.join(filter(str.isalnum, text)).strip()
+    def recognize_plate_text(self, frame, candidates, frame_ref=None):
+        # Candidates are followed across frames; each track is read until its
+        # per-character consensus settles, and looked up whenever that
+        # consensus changes
+        tracks = self.plate_tracker.update(candidates)
+        # Reads that missed an earlier frame's deadline still count for their track
+        by_id = {t.track_id: t for t in self.plate_tracker.tracks}
+        for (track_id, read_ref), text in self.ocr.collect_late():
+            if track_id in by_id:
+                self._add_read(by_id[track_id], text, read_ref)
+        in_flight = {track_id for track_id, _ in self.ocr.pending_keys()}
+        pending = [t for t in tracks if self.plate_tracker.needs_ocr(t) and t.track_id not in in_flight]
+        texts = self.ocr.read_batch([frame[y:y+h, x:x+w] for (x, y, w, h) in (t.box for t in pending)],
+                                    self.scorer.remaining(), keys=[(t.track_id, frame_ref) for t in pending])
+        for track, text in zip(pending, texts):
+            if text is not None:
+                self._add_read(track, text, frame_ref)
 
-            if plate_number:
-                print(f"[INFO] Detected Text: {plate_number}")
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 255), 2)
-                cv2.putText(frame, text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        self.plates = [(t.box, t.consensus) for t in tracks if t.consensus]
+        for track in tracks:
+            # === Lookup DB ===
+            if not self.plate_tracker.needs_lookup(track):
+                continue
+            vehicle_info = self.plate_tracker.lookup(track, self.get_vehicle_info)
+            if vehicle_info:
+                print(f"[MATCHED VEHICLE] {vehicle_info}")
+                self.matched_vehicle_info = vehicle_info
+                self.running = False  
+                self.events.emit("match", vehicle_info)
+                return True 
+        return False
 
-                # === Lookup DB ===
-                vehicle_info = self.get_vehicle_info(plate_number)
-                if vehicle_info:
-                    print(f"[MATCHED VEHICLE] {vehicle_info}")
-                    self.matched_vehicle_info = vehicle_info
-                    self.running = False  
-                    cv2.destroyAllWindows() 
-                    self.show_vehicle_info_gui(vehicle_info)
-                    return True 
-        return False 
+    def _add_read(self, track, text, frame_ref):
+        plate_number = ''.join(filter(str.isalnum, text)).strip()
+        if not plate_number:
+            return
+        print(f"[INFO] Detected Text: {plate_number}")
+        self.plate_tracker.add_read(track, plate_number)
+        if self.events.has_subscribers("detection"):
+            self.events.emit("detection", {"subject": plate_number, "score": None, "frame_ref": frame_ref,
+                                           "details": {"track_id": track.track_id, "consensus": track.consensus}})
 
+    def _render(self, frame, payload):
+        # Viewer thread: paints a frame event
+        for (x, y, w, h), text in payload["plates"]:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 255), 2)
+            cv2.putText(frame, text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        return frame
 
-    def start(self):
-        # Initialize Tkinter root if not already done
-        if self.root is None:
-            self.root = tk.Tk()
-            self.root.withdraw()  # Hide the root window
+    def _quit(self):
+        self.running = False 
 
-        # Set up the OpenCV window
-        screen_width = self.root.winfo_screenwidth()
-        screen_height = self.root.winfo_screenheight()
-        win_width = 1280
-        win_height = 720
-        win_x = (screen_width - win_width) // 2
-        win_y = (screen_height - win_height) // 2
+    def _pump_gui(self):
+        # Keeps open match windows responsive; Tk may only be driven from
+        # the thread that created it
+        if self.root is not None and self._gui_thread is threading.current_thread():
+            self.root.update()
 
-        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(self.window_name, win_width, win_height)
-        cv2.moveWindow(self.window_name, win_x, win_y)
 
+    def start(self):
         # Start the camera
         self.running = True
+        self.plates = []
+        if self.motion_gate:
+            self.motion_gate.reset()
+        self.plate_tracker.reset()
+        # OCR workers warm up in the background while the camera starts
+        self.ocr.start()
         if not self.camera_started:
             print("[INFO] Starting camera feed...")
             self.picam2.start()
             time.sleep(2)
             self.camera_started = True
+        if self.viewer:
+            self.viewer.start()
 
         # Main loop for capturing frames
-        while self.running:
-            frame = self.picam2.capture_array()
-            edges, _ = self.preprocess_frame(frame)
-            candidates = self.find_plate_candidates(edges)
-            match_found = self.recognize_plate_text(frame, candidates)
-
-            if match_found:
-                break  # Immediately exit loop
+        match_found = False
+        try:
+            while self.running:
+                dual = self.frame_source.capture()
+                if dual is None:
+                    print("[INFO] Frame source exhausted")
+                    break
+                watched = self.events.has_subscribers("frame")
+                if watched:
+                    # Fetch the preview's main frame before analysis, while
+                    # the camera still holds its buffer
+                    dual.main
+                # Skip edge detection and OCR while the scene is unchanged
+                if self.motion_gate is None or self.motion_gate.check(dual.lores, dual.captured_at):
+                    started_at = time.time()
+                    edges, gray = self.preprocess_frame(dual.downscaled(self.detect_scale))
+                    candidates = self.locate_plates(edges, gray)
+                    candidates = self.scorer.select(gray, edges, candidates, self.detect_scale, started_at)
+                    # Full-resolution pixels are only needed when there is something to read
+                    main = dual.main if candidates else None
+                    if main is None:
+                        # No candidates, or the camera buffer was already recycled
+                        candidates = []
+                    match_found = self.recognize_plate_text(main, candidates, dual.captured_at)
 
-            cv2.imshow(self.window_name, frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                self.stop()
-                break
+                if watched:
+                    self.events.emit("frame", {"frame": dual.main, "plates": self.plates})
+                self._pump_gui()
+                if match_found:
+                    break  # Immediately exit loop
+        finally:
+            if self.viewer:
+                self.viewer.stop()
+            if isinstance(self.picam2, BusSubscription):
+                # A shared camera keeps running; just stop taking its frames
+                self.picam2.stop()
+                self.camera_started = False
 
-            if self.root:
-                self.root.update()
+        # GUI work happens only once the hot loop has ended
+        if match_found and self.match_gui:
+            self.show_vehicle_info_gui(self.matched_vehicle_info)
 
     def stop_camera_and_windows(self):
         print("[INFO] Stopping camera feed...")
         self.running = False
         if self.camera_started:
+            self.frame_source.release_all()
             self.picam2.stop()
             self.camera_started = False
-        cv2.destroyAllWindows()
+        if self.viewer:
+            self.viewer.stop()
 
     def stop(self):
         self.stop_camera_and_windows()
+        self.ocr.stop()
+        stats = self.scorer.stats()
+        print(f"[INFO] Plate candidates: {stats['candidates']}, OCR calls: {stats['ocr_calls']}, "
+              f"saved: {stats['ocr_saved']}, tracked reads: {self.plate_tracker.ocr_reads}, "
+              f"lookups: {self.plate_tracker.lookups}")
         # Close any open GUI windows and quit Tkinter
         if self.current_gui:
             self.current_gui.destroy()
@@ -124,27 +241,28 @@ class BasicLicensePlateRecognition:
             self.root = None
 
 
+    def _load_plate_index(self):
+        try:
+            self.plate_index = PlateIndex("vehicles.db", max_cost=self.max_plate_cost)
+        except Exception as e:
+            print(f"[INFO] Plate index unavailable: {e}")
+
     def get_vehicle_info(self, plate_number):
-        conn = sqlite3.connect("vehicles.db")
-        c = conn.cursor()
-        c.execute("SELECT * FROM vehicles WHERE plate_number = ?", (plate_number,))
-        result = c.fetchone()
-        conn.close()
-        if result:
-            return {
-                "id": result[0],
-                "plate_number": result[1],
-                "owner": result[2],
-                "make": result[3],
-                "model": result[4],
-                "status": result[5]
-            }
-        return None
+        vehicle_info = self.records.get(plate_number)
+        if vehicle_info or self.plate_index is None:
+            return vehicle_info
+        self.plate_index.refresh()
+        best = self.plate_index.best(plate_number)
+        if best is None:
+            return None
+        print(f"[INFO] {plate_number} read as registered plate {best[0]} (cost {best[1]:.2f})")
+        return self.records.get(best[0])
     
     def show_vehicle_info_gui(self, vehicle_info):
         if self.root is None:
             self.root = tk.Tk()
             self.root.withdraw()
+            self._gui_thread = threading.current_thread()
 
         win = tk.Toplevel(self.root)
         win.title("Vehicle Info Match")
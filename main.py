@@ -1,23 +1,45 @@
+import os
+import threading
 import cv2
 from voice_command_module import VoiceCommandModule
 from output_module import OutputModule
 from camera_module import CameraModule
 from facial_recognition_module import FacialRecognitionModule
 from license_plate_module import BasicLicensePlateRecognition
-from picamera2 import Picamera2
+from frame_source import RecordingSource, open_frame_source
+from frame_bus import FrameBus
+from auditor import AuditLog
 
 class LEOSystem:
     def __init__(self):
-        self.piCamera = Picamera2()
-        config = self.piCamera.create_preview_configuration(
-            main={"format": 'XRGB8888', "size": (1280, 720)}
-        )
-        self.piCamera.configure(config)
-        self.piCamera.start()
+        # Half-size lores stream for detection; full-resolution main only for crops and preview.
+        # LEO_SOURCE swaps the camera for a webcam, clip or recorded session
+        # (e.g. "v4l2:0", "video:patrol.mp4", "replay:session.leorec").
+        self.frame_source = open_frame_source(os.environ.get("LEO_SOURCE", "picamera"), scale=2)
+        if os.environ.get("LEO_RECORD"):
+            self.frame_source = RecordingSource(self.frame_source, os.environ["LEO_RECORD"])
+        self.piCamera = self.frame_source
+        # One capture loop feeds both analyzers; each takes frames at its own
+        # rate. Plate OCR reads full-resolution crops, so the bus fetches
+        # main for it before the camera recycles the buffer.
+        self.frame_bus = FrameBus(self.frame_source)
+        self.face_frames = self.frame_bus.subscribe("faces", max_fps=15)
+        self.plate_frames = self.frame_bus.subscribe("plates", max_fps=8, needs_main=True)
         self.voice_command = VoiceCommandModule()
         self.output = OutputModule()
-        self.face_recognizer = FacialRecognitionModule(self.piCamera)
-        self.license_reader = BasicLicensePlateRecognition(self.piCamera)
+        # LEO_HEADLESS=1 for units without a display: no preview, no Tk, matches are spoken
+        headless = os.environ.get("LEO_HEADLESS") == "1"
+        self.face_recognizer = FacialRecognitionModule(self.face_frames, headless=headless)
+        self.license_reader = BasicLicensePlateRecognition(self.plate_frames, headless=headless)
+        # Every detection and match goes to the append-only audit log off the hot path
+        self.audit = AuditLog(unit_id=os.environ.get("LEO_UNIT_ID")).start()
+        self.audit.attach(self.face_recognizer.events, "face")
+        self.audit.attach(self.license_reader.events, "plate")
+        if headless:
+            self.face_recognizer.events.subscribe(
+                "match", lambda info: self.output.speak(f"Match found: {info['name']}, {info['offence']}"))
+            self.license_reader.events.subscribe(
+                "match", lambda info: self.output.speak(f"Vehicle match: {info['plate_number']}, {info['status']}"))
         self.scanning = False
         self.license = False
 
@@ -34,6 +56,32 @@ class LEOSystem:
         self.output.speak("A vehicle match was found. License plate recognition stopped.")
         self.license = False
 
+    def run_checkpoint(self):
+        # Faces and plates at the same time; the first match ends both
+        self.output.speak("Starting checkpoint: scanning faces and plates...")
+        self.face_recognizer.match_found = False
+        self.license_reader.match_gui = False
+        stop_faces = self.license_reader.events.subscribe(
+            "match", lambda info: self.face_recognizer.stop_camera_and_windows())
+        stop_plates = self.face_recognizer.events.subscribe(
+            "match", lambda info: self.license_reader.stop_camera_and_windows())
+        plates = threading.Thread(target=self.license_reader.start, daemon=True)
+        plates.start()
+        try:
+            self.face_recognizer.run()
+            plates.join()
+        finally:
+            self.license_reader.events.unsubscribe("match", stop_faces)
+            self.face_recognizer.events.unsubscribe("match", stop_plates)
+            self.license_reader.match_gui = not self.license_reader.headless
+        # Tk only on this thread
+        if self.license_reader.matched_vehicle_info and not self.license_reader.headless:
+            self.license_reader.show_vehicle_info_gui(self.license_reader.matched_vehicle_info)
+        print(f"[INFO] Frame bus: {self.frame_bus.stats()}")
+        self.output.speak("Checkpoint ended.")
+        self.scanning = False
+        self.license = False
+
     def stop_license(self):
         self.output.speak("Stopping license plate recognition...")
         self.license_reader.stop()
@@ -86,6 +134,10 @@ class LEOSystem:
                             self.scanning = False
                         self.license = True
                         self.run_license()
+                elif command == "CHECKPOINT":
+                    if not (self.scanning or self.license):
+                        self.scanning = self.license = True
+                        self.run_checkpoint()
                 elif command == "STOP LICENCE":
                     if self.license:
                         self.stop_license()
@@ -98,6 +150,11 @@ class LEOSystem:
                 self.license_reader.stop()
             if self.license:
                 self.face_recognizer.stop()
+        finally:
+            # However LEO exits, queued audit events reach the disk
+            self.frame_bus.stop()
+            self.frame_source.close()
+            self.audit.stop()
 
 if __name__ == "__main__":
     leo = LEOSystem()
@@ -3,31 +3,171 @@ from imutils import paths
 import face_recognition
 import pickle
 import cv2
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from face_index import IVFIndex
+from gallery_compaction import compact_encodings
+from gallery_store import GalleryStore
+from training_cache import TrainingCache
 
 
-def train_face_recognition_model(dataset_path="dataset", output_path="encodings.pickle"):
+def encode_image(imagePath, detection_model="hog", encoding_model="small"):
+    image = cv2.imread(imagePath)
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    boxes = face_recognition.face_locations(rgb, model=detection_model)
+    encodings = face_recognition.face_encodings(rgb, boxes, model=encoding_model)
+    return boxes, encodings
+
+
+def _encode_job(job):
+    # Runs in a pool worker; errors come back as values so one bad image
+    # does not take down the whole run
+    i, imagePath, detection_model, encoding_model = job
+    try:
+        boxes, encodings = encode_image(imagePath, detection_model, encoding_model)
+        return i, boxes, encodings, None
+    except Exception as e:
+        return i, None, None, str(e)
+
+
+def _encode_all(jobs, workers, on_result, cancel_event):
+    if workers <= 1:
+        for job in jobs:
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+            on_result(*_encode_job(job))
+        return True
+
+    # At most two jobs per worker in flight keeps memory bounded on large datasets
+    max_in_flight = workers * 2
+    jobs = iter(jobs)
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            while not cancelled and len(pending) < max_in_flight:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending.add(executor.submit(_encode_job, job))
+            if cancelled:
+                for future in pending:
+                    future.cancel()
+                return False
+            if not pending:
+                return True
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                on_result(*future.result())
+
+
+def train_face_recognition_model(dataset_path="dataset", output_path="encodings.pickle",
+                                 build_index=False, index_path="encodings.index", recall_target=0.95,
+                                 compact=True, max_prototypes=3, cache_path="training_cache.pickle",
+                                 detection_model="hog", encoding_model="small", workers=None,
+                                 progress_callback=None, cancel_event=None, store_path="gallery"):
     print("[INFO] start processing faces...")
-    imagePaths = list(paths.list_images(dataset_path))
-    knownEncodings = []
-    knownIds = []
+    imagePaths = sorted(paths.list_images(dataset_path))
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    cache = None
+    if cache_path:
+        settings = {"detection_model": detection_model, "encoding_model": encoding_model,
+                    "face_recognition": getattr(face_recognition, "__version__", "")}
+        cache = TrainingCache(cache_path, settings)
 
+    results = [None] * len(imagePaths)
+    jobs = []
     for (i, imagePath) in enumerate(imagePaths):
-        print(f"[INFO] processing image {i + 1}/{len(imagePaths)}")
+        cached = cache.get(imagePath) if cache else None
+        if cached is None:
+            jobs.append((i, imagePath, detection_model, encoding_model))
+        else:
+            results[i] = cached
+
+    progress = {"done": 0, "total": len(jobs), "cached": len(imagePaths) - len(jobs), "failures": 0,
+                "images_per_sec": 0.0, "eta": None, "current": None}
+    start_time = time.time()
+
+    def on_result(i, boxes, encodings, error):
+        progress["done"] += 1
+        progress["current"] = imagePaths[i]
+        if error is None:
+            results[i] = (boxes, encodings)
+            if cache:
+                cache.put(imagePaths[i], boxes, encodings)
+        else:
+            progress["failures"] += 1
+            print(f"[INFO] failed to process {imagePaths[i]}: {error}")
+        elapsed = time.time() - start_time
+        progress["images_per_sec"] = progress["done"] / elapsed if elapsed > 0 else 0.0
+        if progress["images_per_sec"] > 0:
+            progress["eta"] = (progress["total"] - progress["done"]) / progress["images_per_sec"]
+        print(f"[INFO] processed image {progress['done']}/{progress['total']} "
+              f"({progress['images_per_sec']:.1f} img/s)")
+        if progress_callback:
+            progress_callback(dict(progress))
+
+    print(f"[INFO] {len(jobs)} images to encode, {progress['cached']} cached, {workers} workers")
+    completed = _encode_all(jobs, workers, on_result, cancel_event)
+
+    if cache:
+        # Keep whatever was encoded so a cancelled run resumes where it stopped
+        removed = cache.prune(imagePaths)
+        cache.save()
+        print(f"[INFO] Training cache: {cache.hits} reused, {cache.misses} encoded, {removed} dropped")
+
+    if not completed:
+        print("[INFO] Training cancelled, encodings left unchanged")
+        return False
+
+    # Merge in sorted path order so the output does not depend on worker timing
+    knownEncodings = []
+    knownIds = []
+    for imagePath, result in zip(imagePaths, results):
+        if result is None:
+            continue
         criminal_id = imagePath.split(os.path.sep)[-2]
-        
-        image = cv2.imread(imagePath)
-        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        boxes = face_recognition.face_locations(rgb, model="hog")
-        encodings = face_recognition.face_encodings(rgb, boxes)
-        
-        for encoding in encodings:
+        for encoding in result[1]:
             knownEncodings.append(encoding)
             knownIds.append(criminal_id)
 
-    print("[INFO] serializing encodings...")
     data = {"encodings": knownEncodings, "ids": knownIds}
-    with open(output_path, "wb") as f:
+    if compact:
+        # Reduce each person to a few representative prototypes for the live matcher
+        prototypes, prototype_ids, qualities = compact_encodings(knownEncodings, knownIds, max_prototypes)
+        print(f"[INFO] Compacted {len(knownIds)} encodings into {len(prototypes)} prototypes")
+        data = {"encodings": prototypes, "ids": prototype_ids, "qualities": qualities,
+                "raw_count": len(knownIds)}
+
+    print("[INFO] serializing encodings...")
+    # Write-then-rename so a running recognizer never reads a half-written file
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
         f.write(pickle.dumps(data))
+    os.replace(tmp_path, output_path)
+
+    index_encodings = data["encodings"]
+    gallery_fingerprint = None
+    if store_path:
+        # New people only add a delta segment; other changes rewrite the store
+        store = GalleryStore(store_path)
+        store.sync(data["encodings"], data["ids"], data.get("qualities"),
+                   model={"encoder": f"dlib_face_recognition_resnet_model_v1/{encoding_model}", "dim": 128,
+                          "dtype": "float32", "detection_model": detection_model},
+                   metadata={"raw_count": len(knownIds), "compacted": compact})
+        gallery_fingerprint = store.manifest["fingerprint"]
+        # sync() appends new identities at the end, so the store's row order
+        # can differ from the pickle's; the index must label the store's rows
+        index_encodings = store.read_all()[0]
+        print(f"[INFO] Gallery store '{store_path}' at generation {store.generation}")
+
+    if build_index and len(index_encodings):
+        IVFIndex.build(index_encodings, recall_target=recall_target,
+                       gallery_fingerprint=gallery_fingerprint).save(index_path)
+        print(f"[INFO] ANN index saved to '{index_path}'")
 
-    print(f"[INFO] Training complete. Encodings saved to '{output_path}'")
\ No newline at end of file
+    print(f"[INFO] Training complete. Encodings saved to '{output_path}'")
+    return True
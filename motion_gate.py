@@ -0,0 +1,63 @@
+import time
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(self, size=(160, 90), pixel_threshold=25, min_changed=0.005, learning_rate=0.05,
+                 refresh_interval=5.0):
+        # Frames are compared at `size` against a running-average background;
+        # a frame passes when at least `min_changed` of its pixels moved, or
+        # when nothing has passed for `refresh_interval` seconds.
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.learning_rate = learning_rate
+        self.refresh_interval = refresh_interval
+        self.background = None
+        self.motion_mask = None
+        self.last_passed = 0.0
+        self.frames_seen = 0
+        self.frames_skipped = 0
+
+    def reset(self):
+        self.background = None
+        self.motion_mask = None
+
+    def check(self, frame, now=None):
+        # `now` lets replayed frames gate on their recorded timestamps
+        self.frames_seen += 1
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(small, (5, 5), 0).astype(np.float32)
+
+        now = time.time() if now is None else now
+        if self.background is None:
+            self.background = gray
+            self.motion_mask = np.ones(gray.shape, dtype=np.uint8)
+            self.last_passed = now
+            return True
+
+        diff = cv2.absdiff(gray, self.background)
+        self.motion_mask = (diff > self.pixel_threshold).astype(np.uint8)
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        if self.motion_mask.mean() >= self.min_changed or now - self.last_passed >= self.refresh_interval:
+            self.last_passed = now
+            return True
+        self.frames_skipped += 1
+        return False
+
+    def motion_regions(self, frame_shape, min_area=4):
+        # Bounding boxes (x, y, w, h) of the moving areas of the last checked
+        # frame, scaled to a frame of `frame_shape`
+        if self.motion_mask is None:
+            return []
+        mask = cv2.dilate(self.motion_mask, np.ones((3, 3), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        sx = frame_shape[1] / self.size[0]
+        sy = frame_shape[0] / self.size[1]
+        keep = stats[1:, cv2.CC_STAT_AREA] >= min_area
+        boxes = stats[1:, :4][keep].astype(np.float64) * [sx, sy, sx, sy]
+        return [tuple(int(v) for v in box) for box in boxes]
@@ -0,0 +1,233 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import cv2
+
+# Each worker process keeps one engine for its whole life
+_engine = None
+_config = None
+
+# Typical time of one plate read on a Pi 4 and the default longest wait per
+# frame, per engine; pytesseract starts a tesseract process for every read
+ENGINE_TIMING = {"tesserocr": (0.05, 0.3), "pytesseract": (0.4, 1.0)}
+
+
+def _init_worker(config):
+    global _engine, _config
+    _config = config
+    try:
+        # tesserocr talks to libtesseract in-process: no subprocess or temp
+        # files per call
+        from tesserocr import PyTessBaseAPI, PSM
+        _engine = PyTessBaseAPI(psm=PSM.SINGLE_LINE)
+    except ImportError:
+        _engine = None
+
+
+def _binarize(roi):
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return thresh
+
+
+def _read(roi):
+    thresh = _binarize(roi)
+    if _engine is not None:
+        from PIL import Image
+        _engine.SetImage(Image.fromarray(thresh))
+        return _engine.GetUTF8Text()
+    import pytesseract
+    return pytesseract.image_to_string(thresh, config=_config)
+
+
+def _read_batch(rois):
+    return [_read(roi) for roi in rois]
+
+
+def _engine_name():
+    return "tesserocr" if _engine is not None else "pytesseract"
+
+
+class OCRService:
+    def __init__(self, workers=None, timeout=None, max_batch=8, config='--psm 7', fast_reader=None):
+        # A frame's plate ROIs are split across the idle long-lived worker
+        # processes. read_batch never waits longer than `timeout` (by default
+        # set from the engine the workers loaded): late reads come back as
+        # None, and when they were given keys they are handed out later by
+        # collect_late() instead of being thrown away. Workers still busy
+        # with an earlier frame are not queued behind; if none is idle the
+        # frame's ROIs are skipped. At most `max_batch` ROIs per frame are
+        # read at all. A fast_reader (PlateReader) gets the first try at
+        # every ROI. The workers are started and warmed up on a background
+        # thread; until they are ready, ROIs the fast_reader can't read are
+        # skipped rather than waited for.
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 2) - 1)
+        self.workers = workers
+        self.requested_timeout = timeout
+        self.timeout = timeout if timeout is not None else ENGINE_TIMING["tesserocr"][1]
+        self.read_time = ENGINE_TIMING["tesserocr"][0]
+        self.engine = None
+        self.max_batch = max_batch
+        self.fast_reader = fast_reader
+        self.config = config
+        self.executor = None
+        self.ready = threading.Event()
+        self.restart_delay = 5.0
+        self._retry_at = 0
+        self._lock = threading.Lock()
+        self.in_flight = set()
+        self.late = {}
+        self.submitted = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.late_reads = 0
+        self.skipped = 0
+        self.failed = 0
+        self.fast_reads = 0
+
+    def start(self):
+        # Returns at once; self.ready is set once every worker has loaded
+        # its engine
+        with self._lock:
+            if self.executor is not None or time.time() < self._retry_at:
+                return
+            self.ready.clear()
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.config,))
+            threading.Thread(target=self._warm_up, args=(self.executor,), daemon=True).start()
+
+    def _warm_up(self, executor):
+        # Pays for process start and engine load off the frame loop
+        try:
+            engines = [f.result() for f in [executor.submit(_engine_name) for _ in range(self.workers)]]
+        except Exception as e:
+            if executor is self.executor:
+                # Workers that can't even start are not retried on every frame
+                print(f"[INFO] OCR workers failed to start ({e}); retrying in {self.restart_delay:.0f}s")
+                self.stop()
+                self._retry_at = time.time() + self.restart_delay
+            return
+        with self._lock:
+            if executor is not self.executor:
+                # Stopped (or restarted) while warming up
+                return
+            self.engine = engines[0]
+            self.read_time, timeout = ENGINE_TIMING[self.engine]
+            if self.requested_timeout is None:
+                self.timeout = timeout
+            self.ready.set()
+        print(f"[INFO] OCR workers use {self.engine}")
+
+    def _reset(self, error):
+        # A worker died (out of memory, tesseract crash): the whole pool is
+        # unusable, so drop it and warm up a new one
+        print(f"[INFO] OCR workers failed ({error}); restarting them")
+        self.failed += sum(len(keys) for keys in self.late.values())
+        self.stop()
+        self.start()
+
+    def stop(self):
+        with self._lock:
+            executor, self.executor = self.executor, None
+            self.ready.clear()
+            in_flight, self.in_flight = self.in_flight, set()
+            self.late = {}
+        if executor is not None:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def pending_keys(self):
+        # Keys of reads still running past their frame's deadline
+        return {key for keys in self.late.values() for key in keys}
+
+    def collect_late(self):
+        # [(key, text)] of late reads that have finished since the last call
+        results = []
+        for future in [f for f in self.late if f.done()]:
+            keys = self.late.pop(future)
+            if future.cancelled() or future.exception() is not None:
+                self.failed += len(keys)
+                if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                    self._reset(future.exception())
+                    break
+                continue
+            results.extend(zip(keys, future.result()))
+            self.late_reads += len(keys)
+        return results
+
+    def read_batch(self, rois, budget=None, keys=None):
+        # Text per ROI (in order), or None for ROIs that were skipped or did
+        # not finish in time. `budget` is what the caller's frame has left;
+        # the wait is at least one typical read and at most self.timeout.
+        # keys[i] identifies ROI i for collect_late().
+        texts = [None] * len(rois)
+        slow = list(range(min(len(rois), self.max_batch)))
+        self.skipped += len(rois) - len(slow)
+        if self.fast_reader is not None:
+            # Standard plates are read in-process; only unsure ones go to Tesseract
+            unsure = []
+            for i in slow:
+                text, confidences = self.fast_reader.read(rois[i])
+                if text and self.fast_reader.confident(confidences):
+                    texts[i] = text
+                    self.fast_reads += 1
+                else:
+                    unsure.append(i)
+            slow = unsure
+        if not slow:
+            return texts
+
+        if not self.ready.is_set():
+            self.start()
+            self.skipped += len(slow)
+            return texts
+        self.in_flight = {f for f in self.in_flight if not f.done()}
+        idle = self.workers - len(self.in_flight)
+        if idle <= 0:
+            self.skipped += len(slow)
+            return texts
+        futures = {}
+        try:
+            for chunk in range(min(idle, len(slow))):
+                indices = slow[chunk::idle]
+                future = self.executor.submit(_read_batch, [rois[i] for i in indices])
+                futures[future] = indices
+                self.in_flight.add(future)
+                self.submitted += len(indices)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # RuntimeError: stop() shut the pool down from another thread
+            for future in futures:
+                future.cancel()
+            self.failed += len(slow)
+            self._reset(e)
+            return texts
+
+        timeout = self.timeout if budget is None else min(self.timeout, max(budget, self.read_time))
+        deadline = time.time() + timeout
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.time()))
+        broken = None
+        for future, indices in futures.items():
+            if future in done:
+                if future.cancelled() or future.exception() is not None:
+                    self.failed += len(indices)
+                    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                        broken = future.exception()
+                    continue
+                for i, text in zip(indices, future.result()):
+                    texts[i] = text
+                self.completed += len(indices)
+            else:
+                # A running chunk keeps its worker busy until it finishes;
+                # with keys its result is still collected on a later frame
+                self.timed_out += len(indices)
+                if keys is not None:
+                    self.late[future] = [keys[i] for i in indices]
+                else:
+                    future.cancel()
+        if broken is not None:
+            self._reset(broken)
+        return texts
@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+
+# Characters Tesseract commonly mistakes for one another share a canonical form
+CONFUSABLE = {"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "G": "6", "B": "8"}
+CONFUSION_COST = 0.25
+
+
+def normalize_plate(text):
+    return "".join(ch for ch in text.upper() if ch.isalnum())
+
+
+def canonical_plate(text):
+    return "".join(CONFUSABLE.get(ch, ch) for ch in normalize_plate(text))
+
+
+def _variants(key):
+    # The key itself plus every single-character deletion (symmetric delete):
+    # two keys within one insert, delete or substitution share a variant
+    out = {key}
+    for i in range(len(key)):
+        out.add(key[:i] + key[i + 1:])
+    return out
+
+
+def _hash(variant):
+    return hash(variant) & 0x7FFFFFFFFFFFFFFF
+
+
+def plate_distance(a, b):
+    # Edit distance where swapping confusable characters is cheap
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [float(i)]
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                cost = 0.0
+            elif CONFUSABLE.get(ca, ca) == CONFUSABLE.get(cb, cb):
+                cost = CONFUSION_COST
+            else:
+                cost = 1.0
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost))
+        previous = current
+    return previous[-1]
+
+
+class PlateIndex:
+    def __init__(self, db_path="vehicles.db", max_cost=0.5, merge_threshold=4096):
+        # Variant hashes of every canonical key live in one sorted int64
+        # array (a million plates is about 60 MB instead of several GB of dict
+        # entries); plates added since the last merge sit in a small dict.
+        # The default max_cost admits up to two confusable swaps but no
+        # arbitrary substitution, insertion or deletion.
+        self.db_path = db_path
+        self.max_cost = max_cost
+        self.merge_threshold = merge_threshold
+        self.keys = []
+        self.plates = {}
+        self.last_id = 0
+        self.row_count = 0
+        self._hashes = np.zeros(0, dtype=np.int64)
+        self._owners = np.zeros(0, dtype=np.int32)
+        self._delta = {}
+        self._conn = None
+        self._data_version = None
+        self._lock = threading.RLock()
+        self.rebuild()
+
+    def __len__(self):
+        return sum(len(p) for p in self.plates.values())
+
+    def _connect(self):
+        if self._conn is None and os.path.exists(self.db_path):
+            self._conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True,
+                                         check_same_thread=False)
+        return self._conn
+
+    def rebuild(self):
+        with self._lock:
+            self.keys, self.plates, self._delta = [], {}, {}
+            self.last_id = self.row_count = 0
+            conn = self._connect()
+            if conn is None:
+                self._hashes = np.zeros(0, dtype=np.int64)
+                self._owners = np.zeros(0, dtype=np.int32)
+                return
+            self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            rows = conn.execute("SELECT id, plate_number FROM vehicles").fetchall()
+            hashes, owners = [], []
+            for row_id, plate in rows:
+                key = self._add_plate(plate)
+                if key is not None:
+                    for variant in _variants(key):
+                        hashes.append(_hash(variant))
+                        owners.append(len(self.keys) - 1)
+                self.last_id = max(self.last_id, row_id)
+            self.row_count = len(rows)
+            self._set_arrays(np.array(hashes, dtype=np.int64), np.array(owners, dtype=np.int32))
+            print(f"[INFO] Plate index holds {len(self)} plates")
+
+    def _set_arrays(self, hashes, owners):
+        order = np.argsort(hashes, kind="stable")
+        self._hashes = hashes[order]
+        self._owners = owners[order]
+
+    def _add_plate(self, plate):
+        # Returns the canonical key when it is new, None otherwise
+        # Plates are kept as stored so callers can look the row up again
+        if not plate:
+            return None
+        key = canonical_plate(plate)
+        if not key:
+            return None
+        if key in self.plates:
+            if plate not in self.plates[key]:
+                self.plates[key].append(plate)
+            return None
+        self.plates[key] = [plate]
+        self.keys.append(key)
+        return key
+
+    def add(self, plate):
+        with self._lock:
+            key = self._add_plate(plate)
+            if key is None:
+                return
+            owner = len(self.keys) - 1
+            for variant in _variants(key):
+                self._delta.setdefault(_hash(variant), []).append(owner)
+            if len(self._delta) >= self.merge_threshold:
+                self._merge()
+
+    def _merge(self):
+        hashes = [h for h, owners in self._delta.items() for _ in owners]
+        owners = [o for owners in self._delta.values() for o in owners]
+        self._set_arrays(np.concatenate([self._hashes, np.array(hashes, dtype=np.int64)]),
+                         np.concatenate([self._owners, np.array(owners, dtype=np.int32)]))
+        self._delta = {}
+
+    def refresh(self):
+        # Cheap when nothing changed: one PRAGMA. New rows are appended to
+        # the index; deletions force a rebuild.
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return
+            self._data_version = version
+            count = conn.execute("SELECT COUNT(*) FROM vehicles").fetchone()[0]
+            rows = conn.execute("SELECT id, plate_number FROM vehicles WHERE id > ?", (self.last_id,)).fetchall()
+            # INSERT OR REPLACE deletes the old row, so a drop in the count
+            # not explained by new rows means plates were removed
+            if count < self.row_count + len(rows) - sum(1 for _, p in rows if self._known(p)):
+                self.rebuild()
+                return
+            for row_id, plate in rows:
+                self.add(plate)
+                self.last_id = max(self.last_id, row_id)
+            self.row_count = count
+
+    def _known(self, plate):
+        return plate in self.plates.get(canonical_plate(plate or ""), ())
+
+    def lookup(self, text, limit=5, max_cost=None):
+        # Ranked [(plate_number, cost)] of registered plates within max_cost
+        # of the OCR string; cost 0 is an exact read
+        max_cost = self.max_cost if max_cost is None else max_cost
+        text = normalize_plate(text)
+        key = canonical_plate(text)
+        if not key:
+            return []
+        with self._lock:
+            queries = np.array([_hash(v) for v in _variants(key)], dtype=np.int64)
+            left = np.searchsorted(self._hashes, queries, side="left")
+            right = np.searchsorted(self._hashes, queries, side="right")
+            owners = set()
+            for lo, hi in zip(left, right):
+                if hi > lo:
+                    owners.update(self._owners[lo:hi].tolist())
+            for q in queries.tolist():
+                owners.update(self._delta.get(q, ()))
+            candidates = [plate for owner in owners for plate in self.plates[self.keys[owner]]]
+
+        scored = []
+        for plate in candidates:
+            cost = plate_distance(text, normalize_plate(plate))
+            if cost <= max_cost:
+                scored.append((plate, cost))
+        scored.sort(key=lambda item: (item[1], item[0]))
+        return scored[:limit]
+
+    def best(self, text, max_cost=None):
+        # The single closest plate, or None when two plates tie for it: an
+        # ambiguous read is not a watchlist hit
+        matches = self.lookup(text, limit=2, max_cost=max_cost)
+        if not matches or (len(matches) > 1 and matches[1][1] == matches[0][1]):
+            return None
+        return matches[0]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
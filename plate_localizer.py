@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+
+class PlateLocalizer:
+    def __init__(self, levels=(1.0, 0.5), min_size=(60, 20), aspect_range=(2.0, 6.0), min_fill=0.45,
+                 kernel=(17, 3), iou_threshold=0.3, pad=(0.12, 0.25)):
+        # Plates are found without a per-contour Python loop: at every pyramid
+        # level a horizontal gradient is thresholded and closed with a wide
+        # kernel so a row of characters becomes one blob, then the blobs'
+        # connected-component stats are filtered in bulk. `min_size` is in
+        # full-frame pixels; `kernel` is for level 1.0 of the detection image.
+        self.levels = levels
+        self.min_size = min_size
+        self.aspect_range = aspect_range
+        self.min_fill = min_fill
+        self.kernel = kernel
+        self.iou_threshold = iou_threshold
+        # The blob covers the characters only; OCR wants the plate border too
+        self.pad = pad
+
+    def _level_boxes(self, gray, level, scale):
+        small = gray if level == 1.0 else cv2.resize(gray, (0, 0), fx=level, fy=level,
+                                                     interpolation=cv2.INTER_AREA)
+        # Characters give strong vertical strokes: |d/dx| picks them out and
+        # ignores most horizontal clutter (roof lines, bumpers)
+        grad = cv2.convertScaleAbs(cv2.Sobel(small, cv2.CV_16S, 1, 0, ksize=3))
+        _, binary = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        kw = max(3, int(self.kernel[0] * level)) | 1
+        kh = max(1, int(self.kernel[1] * level)) | 1
+        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (kw, kh)))
+        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        stats = stats[1:].astype(np.float64)
+        x, y, w, h, area = stats.T
+        factor = scale / level
+        aspect = w / np.maximum(h, 1)
+        keep = ((aspect > self.aspect_range[0]) & (aspect < self.aspect_range[1])
+                & (w * factor > self.min_size[0]) & (h * factor > self.min_size[1])
+                & (area / np.maximum(w * h, 1) >= self.min_fill))
+        boxes = np.stack([x, y, w, h], axis=1)[keep] * factor
+        return boxes.astype(int), (area / np.maximum(w * h, 1))[keep]
+
+    def locate(self, gray, scale=1):
+        # `gray` is the detection image, `scale` times smaller than the full
+        # frame; returns full-frame (x, y, w, h) boxes
+        boxes, fills = [], []
+        for level in self.levels:
+            level_boxes, level_fills = self._level_boxes(gray, level, scale)
+            boxes.append(level_boxes)
+            fills.append(level_fills)
+        boxes = np.concatenate(boxes) if boxes else np.zeros((0, 4), dtype=int)
+        fills = np.concatenate(fills) if fills else np.zeros(0)
+        if len(boxes) == 0:
+            return []
+        # The same plate found at two levels: keep the best-filled box
+        keep = np.array(cv2.dnn.NMSBoxes(boxes.tolist(), fills.tolist(), 0.0, self.iou_threshold)).ravel()
+        boxes = boxes[keep].astype(np.float64)
+        height, width = gray.shape[0] * scale, gray.shape[1] * scale
+        px, py = boxes[:, 2] * self.pad[0], boxes[:, 3] * self.pad[1]
+        x0 = np.clip(boxes[:, 0] - px, 0, width)
+        y0 = np.clip(boxes[:, 1] - py, 0, height)
+        x1 = np.clip(boxes[:, 0] + boxes[:, 2] + px, 0, width)
+        y1 = np.clip(boxes[:, 1] + boxes[:, 3] + py, 0, height)
+        return [(int(a), int(b), int(c - a), int(d - b)) for a, b, c, d in zip(x0, y0, x1, y1)]
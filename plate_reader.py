@@ -0,0 +1,123 @@
+import os
+import pickle
+import cv2
+import numpy as np
+
+GLYPH_SIZE = (16, 24)  # width, height
+CHARSET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+def _binarize(roi):
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Characters are the minority colour; flip light-on-dark plates
+    if np.count_nonzero(binary) > binary.size // 2:
+        binary = 255 - binary
+    return binary
+
+
+def _glyph_vector(glyph):
+    # Zero-mean, unit-length so a dot product is a normalized correlation
+    glyph = cv2.resize(glyph, GLYPH_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    glyph -= glyph.mean()
+    norm = np.linalg.norm(glyph)
+    return glyph / norm if norm > 0 else glyph
+
+
+def segment_characters(roi, min_height=0.35, max_height=0.95):
+    # Left-to-right character crops of a plate ROI, as white-on-black binaries
+    binary = _binarize(roi)
+    height, width = binary.shape
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    if count <= 1:
+        return []
+    x, y, w, h = (stats[1:, i] for i in range(4))
+    keep = (h >= min_height * height) & (h <= max_height * height) & (w <= 0.25 * width) & (h >= w * 0.9)
+    order = np.argsort(x[keep])
+    boxes = np.stack([x, y, w, h], axis=1)[keep][order]
+    return [binary[by:by + bh, bx:bx + bw] for bx, by, bw, bh in boxes]
+
+
+class TemplateBank:
+    def __init__(self, vectors, labels):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.labels = list(labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def from_font(cls, fonts=(cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX), thicknesses=(2, 3, 4)):
+        # Generic bank rendered with OpenCV's fonts; a bank learned from our
+        # own plates (from_labelled_plates) is far more accurate
+        vectors, labels = [], []
+        for font in fonts:
+            for thickness in thicknesses:
+                for ch in CHARSET:
+                    canvas = np.zeros((80, 60), dtype=np.uint8)
+                    cv2.putText(canvas, ch, (5, 65), font, 2.0, 255, thickness)
+                    ys, xs = np.nonzero(canvas)
+                    vectors.append(_glyph_vector(canvas[ys.min():ys.max() + 1, xs.min():xs.max() + 1]))
+                    labels.append(ch)
+        return cls(vectors, labels)
+
+    @classmethod
+    def from_labelled_plates(cls, samples):
+        # samples: (roi, plate_text) pairs. Plates whose segmentation yields
+        # exactly one glyph per character contribute every glyph.
+        vectors, labels = [], []
+        for roi, text in samples:
+            glyphs = segment_characters(roi)
+            if len(glyphs) != len(text):
+                continue
+            for glyph, ch in zip(glyphs, text):
+                vectors.append(_glyph_vector(glyph))
+                labels.append(ch)
+        return cls(vectors, labels)
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"vectors": self.vectors, "labels": self.labels, "glyph_size": GLYPH_SIZE}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if tuple(data["glyph_size"]) != GLYPH_SIZE:
+            raise ValueError(f"Template bank '{path}' was built for another glyph size")
+        return cls(data["vectors"], data["labels"])
+
+
+class PlateReader:
+    def __init__(self, bank=None, min_confidence=0.5, min_chars=4, max_chars=10, full_margin=0.15):
+        # Segments a plate ROI and matches every glyph against the bank in one
+        # matrix product. A glyph's confidence is its correlation with the
+        # best template, scaled down when another character's best template
+        # comes within `full_margin` of it.
+        self.bank = bank if bank is not None else TemplateBank.from_font()
+        self.min_confidence = min_confidence
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.full_margin = full_margin
+        self._labels = np.array(self.bank.labels)
+
+    def read(self, roi):
+        # (text, per-character confidences); text is None when the plate
+        # could not be segmented into a plausible number of characters
+        glyphs = segment_characters(roi)
+        if not self.min_chars <= len(glyphs) <= self.max_chars:
+            return None, []
+        scores = np.stack([_glyph_vector(g) for g in glyphs]) @ self.bank.vectors.T
+        best = scores.argmax(axis=1)
+        best_labels = self._labels[best]
+        best_scores = scores[np.arange(len(glyphs)), best]
+        # Runner-up among templates of a different character
+        other = np.where(self._labels[None, :] == best_labels[:, None], -np.inf, scores)
+        margins = best_scores - other.max(axis=1)
+        confidences = np.clip(best_scores, 0, 1) * np.clip(margins / self.full_margin, 0, 1)
+        return "".join(best_labels), confidences.tolist()
+
+    def confident(self, confidences):
+        return bool(confidences) and min(confidences) >= self.min_confidence
@@ -0,0 +1,109 @@
+import time
+import cv2
+import numpy as np
+
+
+def _box_iou(a, b):
+    # Boxes are (x, y, w, h)
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def suppress_overlaps(boxes, scores, iou_threshold=0.3):
+    # Greedy non-maximum suppression; returns indices, best score first
+    keep = []
+    for i in sorted(range(len(boxes)), key=lambda i: scores[i], reverse=True):
+        if all(_box_iou(boxes[i], boxes[j]) < iou_threshold for j in keep):
+            keep.append(i)
+    return keep
+
+
+def character_components(binary, min_chars=4, max_chars=10):
+    # Plate text shows up as a row of separate blobs of similar height that
+    # fill most of the plate's height and are taller than wide
+    height, width = binary.shape
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary)
+    if count <= 1:
+        return 0.0
+    w = stats[1:, cv2.CC_STAT_WIDTH]
+    h = stats[1:, cv2.CC_STAT_HEIGHT]
+    chars = (h >= 0.3 * height) & (h <= 0.95 * height) & (w <= 0.25 * width) & (h >= w) & (h <= 6 * w)
+    n = int(chars.sum())
+    if n < 2:
+        return 0.0
+    # Similar heights: a spread of more than a third of the median is not text
+    heights = h[chars]
+    uniform = max(0.0, 1.0 - np.std(heights) / (np.median(heights) + 1e-6) * 3)
+    if min_chars <= n <= max_chars:
+        count_term = 1.0
+    else:
+        count_term = min(n, max_chars) / max_chars if n < min_chars else max_chars / n
+    return count_term * (0.5 + 0.5 * uniform)
+
+
+def score_candidate(gray, edges, box):
+    # Score in [0, 1] of a box (x, y, w, h) given in gray/edges pixels
+    x, y, w, h = box
+    roi = gray[y:y + h, x:x + w]
+    if roi.size == 0 or min(roi.shape) < 4:
+        return 0.0
+    edge_density = float(np.count_nonzero(edges[y:y + h, x:x + w])) / roi.size
+    # Text on a plate gives 10-40% edge pixels; flat panels and foliage fall outside
+    edge_term = max(0.0, 1.0 - abs(edge_density - 0.2) / 0.2)
+    contrast_term = min(float(roi.std()) / 50.0, 1.0)
+    _, binary = cv2.threshold(roi, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    chars = max(character_components(binary), character_components(255 - binary))
+    return 0.6 * chars + 0.2 * edge_term + 0.2 * contrast_term
+
+
+class PlateCandidateScorer:
+    def __init__(self, top_k=3, min_score=0.35, iou_threshold=0.3, budget=0.15):
+        # Candidates are scored on the detection-scale gray/edge images, merged
+        # by NMS, and only the top_k above min_score go to OCR. `budget` is the
+        # per-frame time for scoring plus OCR; scoring stops when it runs out
+        # and remaining() tells OCR how long it may take.
+        self.top_k = top_k
+        self.min_score = min_score
+        self.iou_threshold = iou_threshold
+        self.budget = budget
+        self.candidates_seen = 0
+        self.ocr_requested = 0
+        self.last_scores = []
+        self._deadline = None
+
+    @property
+    def ocr_saved(self):
+        return self.candidates_seen - self.ocr_requested
+
+    def select(self, gray, edges, candidates, scale=1, started_at=None):
+        # `candidates` are full-frame (x, y, w, h); gray and edges are `scale`
+        # times smaller. Returns the chosen full-frame boxes, best first.
+        started_at = time.time() if started_at is None else started_at
+        self._deadline = started_at + self.budget
+        self.candidates_seen += len(candidates)
+        # Larger boxes first so a tight budget still scores the likeliest plates
+        order = sorted(range(len(candidates)), key=lambda i: candidates[i][2] * candidates[i][3], reverse=True)
+        boxes, scores = [], []
+        for i in order:
+            if time.time() >= self._deadline:
+                break
+            x, y, w, h = (int(v / scale) for v in candidates[i])
+            score = score_candidate(gray, edges, (x, y, w, h))
+            if score >= self.min_score:
+                boxes.append(candidates[i])
+                scores.append(score)
+        keep = suppress_overlaps(boxes, scores, self.iou_threshold)[:self.top_k]
+        self.ocr_requested += len(keep)
+        self.last_scores = [scores[i] for i in keep]
+        return [boxes[i] for i in keep]
+
+    def remaining(self):
+        if self._deadline is None:
+            return self.budget
+        return max(0.0, self._deadline - time.time())
+
+    def stats(self):
+        return {"candidates": self.candidates_seen, "ocr_calls": self.ocr_requested, "ocr_saved": self.ocr_saved}
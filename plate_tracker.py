@@ -0,0 +1,106 @@
+from collections import Counter, defaultdict
+
+
+def _iou(a, b):
+    # Boxes are (x, y, w, h) in full-frame pixels
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+class PlateTrack:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.reads = []
+        self.consensus = ""
+        self.unchanged = 0
+        self.misses = 0
+        self.looked_up = set()
+        self.vehicle_info = None
+
+    def add_read(self, text):
+        self.reads.append(text)
+        # Length is voted on first; only reads of the winning length vote
+        # per character position
+        length = Counter(len(r) for r in self.reads).most_common(1)[0][0]
+        votes = defaultdict(Counter)
+        for read in self.reads:
+            if len(read) == length:
+                for i, ch in enumerate(read):
+                    votes[i][ch] += 1
+        consensus = "".join(votes[i].most_common(1)[0][0] for i in range(length))
+        self.unchanged = self.unchanged + 1 if consensus == self.consensus else 0
+        self.consensus = consensus
+
+
+class PlateTracker:
+    def __init__(self, match_iou=0.2, max_misses=5, stable_reads=2, max_reads=6):
+        # A track stops being OCR'd once its consensus survived stable_reads
+        # further reads unchanged, or after max_reads reads in any case. Each
+        # distinct consensus is looked up once, so a plate that is only in
+        # view for a frame or two is still checked, and a settled track
+        # costs no further lookups.
+        self.match_iou = match_iou
+        self.max_misses = max_misses
+        self.stable_reads = stable_reads
+        self.max_reads = max_reads
+        self.tracks = []
+        self.ocr_reads = 0
+        self.lookups = 0
+        self._next_id = 1
+
+    def reset(self):
+        self.tracks = []
+
+    def is_settled(self, track):
+        return bool(track.consensus) and (track.unchanged >= self.stable_reads or len(track.reads) >= self.max_reads)
+
+    def update(self, boxes):
+        # Greedy IoU association of this frame's candidates; returns the
+        # tracks seen in this frame
+        pairs = sorted(((_iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks) for bi, b in enumerate(boxes)),
+                       reverse=True)
+        used_tracks, used_boxes = set(), set()
+        for iou, ti, bi in pairs:
+            if iou < self.match_iou or ti in used_tracks or bi in used_boxes:
+                continue
+            self.tracks[ti].box = tuple(boxes[bi])
+            self.tracks[ti].misses = 0
+            used_tracks.add(ti)
+            used_boxes.add(bi)
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        for bi, box in enumerate(boxes):
+            if bi not in used_boxes:
+                survivors.append(PlateTrack(self._next_id, tuple(box)))
+                self._next_id += 1
+        self.tracks = survivors
+        return [t for t in self.tracks if t.misses == 0]
+
+    def needs_ocr(self, track):
+        return not self.is_settled(track)
+
+    def add_read(self, track, text):
+        self.ocr_reads += 1
+        track.add_read(text)
+
+    def needs_lookup(self, track):
+        return bool(track.consensus) and track.consensus not in track.looked_up
+
+    def lookup(self, track, get_info):
+        # get_info(plate) runs once per consensus the track reaches; later
+        # frames reuse the last result
+        if self.needs_lookup(track):
+            track.vehicle_info = get_info(track.consensus)
+            track.looked_up.add(track.consensus)
+            self.lookups += 1
+        return track.vehicle_info
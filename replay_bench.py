@@ -0,0 +1,174 @@
+import csv
+import os
+import sys
+import time
+import cv2
+from frame_source import RecordingSource, open_frame_source
+
+
+def _report(name, timings, frames, wall):
+    if not timings:
+        print(f"[INFO] {name}: no frames analysed")
+        return
+    timings = sorted(timings)
+    mean = sum(timings) / len(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"[INFO] {name}: {len(timings)}/{frames} frames analysed, mean {mean * 1000:.1f} ms, "
+          f"p95 {p95 * 1000:.1f} ms, {frames / wall:.1f} fps end to end")
+
+
+def bench_faces(source, **kwargs):
+    # Runs the face scan's analysis path headless over every frame of `source`
+    from facial_recognition_module import FacialRecognitionModule
+    module = FacialRecognitionModule(source, reload_interval=0, headless=True, **kwargs)
+    timings, frames, ids = [], 0, {}
+    start = time.time()
+    for frame in source:
+        frames += 1
+        t0 = time.time()
+        _, _, face_ids = module._analyze(frame)
+        timings.append(time.time() - t0)
+        for face_id in face_ids:
+            ids[face_id] = ids.get(face_id, 0) + 1
+    _report("Face analysis", timings, frames, time.time() - start)
+    print(f"[INFO] Identities seen: {ids}")
+    return timings
+
+
+def bench_plates(source, ocr=True, roi_dir=None):
+    # Edge detection, candidate search and (optionally) OCR per frame,
+    # without the database lookup or any window
+    from license_plate_module import BasicLicensePlateRecognition
+    module = BasicLicensePlateRecognition(source, headless=True)
+    timings, frames, texts = [], 0, {}
+    if ocr:
+        # Time the reads, not the worker start-up
+        module.ocr.start()
+        module.ocr.ready.wait(60)
+    start = time.time()
+    for frame in source:
+        frames += 1
+        t0 = time.time()
+        if module.motion_gate is None or module.motion_gate.check(frame.lores, frame.captured_at):
+            edges, gray = module.preprocess_frame(frame.downscaled(module.detect_scale))
+            candidates = module.locate_plates(edges, gray)
+            candidates = module.scorer.select(gray, edges, candidates, module.detect_scale, t0)
+            if roi_dir:
+                main = frame.main
+                for i, (x, y, w, h) in enumerate(candidates):
+                    cv2.imwrite(os.path.join(roi_dir, f"{frames:05d}_{i}.png"), main[y:y + h, x:x + w])
+            if ocr:
+                main = frame.main
+                rois = [main[y:y + h, x:x + w] for x, y, w, h in candidates]
+                for text in module.ocr.read_batch(rois, module.scorer.remaining()):
+                    text = ''.join(filter(str.isalnum, text or ""))
+                    if text:
+                        texts[text] = texts.get(text, 0) + 1
+        timings.append(time.time() - t0)
+    module.ocr.stop()
+    _report("Plate analysis", timings, frames, time.time() - start)
+    print(f"[INFO] OCR: {module.ocr.fast_reads} template reads, {module.ocr.completed} Tesseract reads, "
+          f"{module.ocr.timed_out} timed out, {module.ocr.skipped} skipped")
+    print(f"[INFO] Candidate scoring: {module.scorer.stats()}")
+    print(f"[INFO] Plate texts seen: {texts}")
+    return timings
+
+
+def _load_rois(roi_dir):
+    # ROI images plus the plate text from roi_dir/labels.csv ("file,text")
+    # when present
+    labels = {}
+    labels_path = os.path.join(roi_dir, "labels.csv")
+    if os.path.exists(labels_path):
+        with open(labels_path, newline="") as f:
+            labels = {row[0]: row[1].strip().upper() for row in csv.reader(f) if len(row) >= 2}
+    names = sorted(n for n in os.listdir(roi_dir) if n.lower().endswith((".png", ".jpg")))
+    return [(name, cv2.imread(os.path.join(roi_dir, name)), labels.get(name)) for name in names]
+
+
+def build_templates(roi_dir, output_path="plate_templates.pickle"):
+    # Learns the glyph bank from labelled ROIs of our own plates
+    from plate_reader import TemplateBank
+    samples = [(roi, label) for _, roi, label in _load_rois(roi_dir) if label]
+    bank = TemplateBank.from_labelled_plates(samples)
+    bank.save(output_path)
+    print(f"[INFO] Saved {len(bank)} glyph templates from {len(samples)} labelled plates to {output_path}")
+
+
+def bench_ocr(roi_dir, template_path="plate_templates.pickle", tesseract=True):
+    # Template reader against Tesseract on the same recorded ROIs: per-read
+    # time, how often the template path is confident, and accuracy where
+    # labels exist
+    from plate_reader import PlateReader, TemplateBank
+    from ocr_service import _binarize
+    bank = TemplateBank.load(template_path) if os.path.exists(template_path) else TemplateBank.from_font()
+    reader = PlateReader(bank)
+    rois = _load_rois(roi_dir)
+    results = {"template": [], "tesseract": []}
+    confident = 0
+    for name, roi, label in rois:
+        t0 = time.perf_counter()
+        text, confidences = reader.read(roi)
+        results["template"].append((time.perf_counter() - t0, text, label))
+        confident += reader.confident(confidences)
+        if tesseract:
+            import pytesseract
+            t0 = time.perf_counter()
+            text = pytesseract.image_to_string(_binarize(roi), config='--psm 7')
+            text = ''.join(filter(str.isalnum, text)).upper()
+            results["tesseract"].append((time.perf_counter() - t0, text, label))
+    for engine, rows in results.items():
+        if not rows:
+            continue
+        mean = sum(r[0] for r in rows) / len(rows)
+        labelled = [r for r in rows if r[2]]
+        correct = sum(1 for r in labelled if r[1] == r[2])
+        accuracy = f", {correct}/{len(labelled)} correct" if labelled else ""
+        print(f"[INFO] {engine}: {len(rows)} ROIs, mean {mean * 1000:.2f} ms{accuracy}")
+    print(f"[INFO] Template reader confident on {confident}/{len(rois)} ROIs")
+
+
+def record(spec, path, frames=300):
+    # Saves `frames` frames of a live source for later replay
+    source = RecordingSource(open_frame_source(spec, scale=2), path)
+    source.start()
+    try:
+        for i, _ in enumerate(source):
+            if i + 1 >= frames:
+                break
+    finally:
+        source.close()
+    print(f"[INFO] Recorded {source.recorder.frames} frames to {path}")
+
+
+if __name__ == "__main__":
+    # python replay_bench.py faces|plates|record <source spec> [recording path]
+    # python replay_bench.py rois <source spec> <roi dir>   (dump plate candidates)
+    # python replay_bench.py templates|ocr <roi dir>
+    # Replays run as fast as the analysis allows, so runs are repeatable and
+    # comparable between commits.
+    mode = sys.argv[1] if len(sys.argv) > 1 else "faces"
+    spec = sys.argv[2] if len(sys.argv) > 2 else "synthetic"
+    if mode == "record":
+        record(spec, sys.argv[3] if len(sys.argv) > 3 else "session.leorec")
+    elif mode == "templates":
+        build_templates(spec)
+    elif mode == "ocr":
+        bench_ocr(spec)
+    else:
+        kwargs = {"scale": 2}
+        if spec == "synthetic":
+            kwargs["frames"] = 300
+        source = open_frame_source(spec, **kwargs)
+        source.start()
+        try:
+            if mode == "rois":
+                roi_dir = sys.argv[3] if len(sys.argv) > 3 else "plate_rois"
+                os.makedirs(roi_dir, exist_ok=True)
+                bench_plates(source, ocr=False, roi_dir=roi_dir)
+            elif mode == "plates":
+                bench_plates(source)
+            else:
+                bench_faces(source)
+        finally:
+            source.close()
@@ -1,15 +1,20 @@
 from flask import Flask, request, jsonify, Response
 import os
-from picamera2 import Picamera2
+import sys
 import cv2
 import face_recognition
 import sqlite3
 import pickle
 import numpy as np
+import threading
 import time
 import io
 from PIL import Image
 
+# The camera backends live in the main LEO package one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_source import open_frame_source
+
 app = Flask(__name__)
 
 # Directory to save captured images
@@ -37,15 +42,158 @@ init_db()
 # Initialize the camera and face detection state
 camera = None
 captured_images = []
-face_detected = False
+
+
+class StreamHub:
+    def __init__(self, detect_fps=4, detect_scale=0.5, jpeg_quality=80):
+        # One thread captures from the camera, detects faces at most
+        # detect_fps times a second on a detect_scale-sized copy, and
+        # JPEG-encodes each frame once. Every /video_feed client reads the
+        # latest encoded frame; a client that falls behind skips straight to
+        # the newest one, so extra viewers cost no capture, detection or
+        # encoding work. With no client connected only the newest raw frame
+        # is kept, and faces are detected when someone asks.
+        self.detect_fps = detect_fps
+        self.detect_scale = detect_scale
+        self.jpeg_quality = jpeg_quality
+        self.running = False
+        self.face_detected = False
+        self.face_locations = []
+        self.clients = 0
+        self.frames_encoded = 0
+        self.frames_skipped = 0
+        self._frame = None
+        self._jpeg = None
+        self._seq = 0
+        self._next_detect = 0.0
+        self._thread = None
+        self._cond = threading.Condition()
+        # Serialises camera start-up only; the 2 s warm-up must not hold
+        # _cond, which every client and route takes
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self.running:
+                return True
+            if not initialize_camera():
+                return False
+            with self._cond:
+                self.running = True
+            self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+            self._thread.start()
+            return True
+
+    def connect(self):
+        with self._cond:
+            self.clients += 1
+
+    def disconnect(self):
+        with self._cond:
+            self.clients -= 1
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self.face_detected = False
+        self.face_locations = []
+
+    def _detect(self, frame):
+        small = cv2.resize(frame, (0, 0), fx=self.detect_scale, fy=self.detect_scale)
+        small_rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        scale = 1.0 / self.detect_scale
+        self.face_locations = [tuple(int(v * scale) for v in loc)
+                               for loc in face_recognition.face_locations(small_rgb)]
+        self.face_detected = len(self.face_locations) > 0
+
+    def _capture_loop(self):
+        while self.running:
+            try:
+                frame = camera.capture_array()
+            except Exception as e:
+                print(f"Error capturing frame: {e}")
+                close_camera()
+                break
+            if frame is None:
+                # Finite sources (replays, video files) have ended
+                print("Camera stream ended")
+                close_camera()
+                break
+
+            with self._cond:
+                watched = self.clients > 0
+                if not watched:
+                    self._frame = frame
+            if not watched:
+                continue
+
+            # Detection is throttled; boxes from the last run are drawn on
+            # the frames in between
+            now = time.time()
+            if now >= self._next_detect:
+                self._next_detect = now + 1.0 / self.detect_fps
+                self._detect(frame)
+
+            preview = frame.copy()
+            for (top, right, bottom, left) in self.face_locations:
+                cv2.rectangle(preview, (left, top), (right, bottom), (0, 255, 0), 2)
+            ok, buffer = cv2.imencode('.jpg', preview, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                continue
+            with self._cond:
+                self._frame = frame
+                self._jpeg = buffer.tobytes()
+                self._seq += 1
+                self.frames_encoded += 1
+                self._cond.notify_all()
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+
+    def check_face(self):
+        # Streaming clients keep face_detected current; without one, the
+        # newest frame is checked here, at most detect_fps times a second
+        with self._cond:
+            frame = self._frame if self.clients == 0 else None
+        now = time.time()
+        if frame is not None and now >= self._next_detect:
+            self._next_detect = now + 1.0 / self.detect_fps
+            self._detect(frame)
+        return self.face_detected
+
+    def latest_frame(self):
+        # The undecorated frame behind the current JPEG
+        with self._cond:
+            return self._frame
+
+    def wait_for_frame(self, last_seq, timeout=1.0):
+        # (jpeg, seq) newer than last_seq, or (None, last_seq) on timeout
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or not self.running, timeout)
+            if self._seq > last_seq:
+                # Frames encoded while this client was still sending are skipped
+                if last_seq:
+                    self.frames_skipped += self._seq - last_seq - 1
+                return self._jpeg, self._seq
+            return None, last_seq
+
+
+hub = StreamHub()
+
 
 def initialize_camera():
     global camera
     try:
         if camera is None:
             print("Initializing camera...")
-            camera = Picamera2()
-            camera.configure(camera.create_preview_configuration(main={"size": (640, 480)}))
+            # LEO_SOURCE selects another backend, e.g. a replay for testing
+            spec = os.environ.get("LEO_SOURCE", "picamera")
+            kwargs = {"main_size": (640, 480), "lores": False} if spec == "picamera" else {}
+            camera = open_frame_source(spec, scale=1, **kwargs)
             camera.start()
             time.sleep(2)  # Allow camera to warm up
             print("Camera initialized successfully")
@@ -60,10 +208,12 @@ def initialize_camera():
 
 def close_camera():
     global camera
+    # The capture thread must be done with the camera before it is stopped
+    hub.stop()
     try:
         if camera is not None:
             print("Closing camera...")
-            camera.stop()
+            camera.close()
             camera = None
             print("Camera closed successfully")
     except Exception as e:
@@ -71,8 +221,7 @@ def close_camera():
         camera = None
 
 def generate_frames():
-    global camera, face_detected
-    if not initialize_camera():
+    if not hub.start():
         print("Camera initialization failed, sending placeholder image")
         placeholder = np.zeros((480, 640, 3), dtype=np.uint8)
         cv2.putText(placeholder, "Camera not available", (150, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
@@ -82,42 +231,21 @@ def generate_frames():
                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
         return
 
-    while True:
-        try:
-            if camera is None:
-                print("Camera became None during streaming, reinitializing...")
-                if not initialize_camera():
+    hub.connect()
+    try:
+        last_seq = 0
+        while True:
+            frame_bytes, last_seq = hub.wait_for_frame(last_seq)
+            if frame_bytes is None:
+                if not hub.running:
                     break
-
-            # Capture frame
-            frame = camera.capture_array()
-            if frame is None:
-                print("Captured frame is None, reinitializing camera...")
-                close_camera()
                 continue
 
-            # Convert to RGB for face detection
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Detect faces
-            face_locations = face_recognition.face_locations(frame_rgb)
-            face_detected = len(face_locations) > 0
-
-            # Draw bounding boxes around detected faces
-            for (top, right, bottom, left) in face_locations:
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-
-            # Convert to JPEG
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame_bytes = buffer.tobytes()
-
             # Yield frame in MJPEG format
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        except Exception as e:
-            print(f"Error capturing frame: {e}")
-            close_camera()
-            break
+    finally:
+        hub.disconnect()
 
 @app.route("/video_feed")
 def video_feed():
@@ -126,14 +254,12 @@ def video_feed():
 
 @app.route("/check_face", methods=["GET"])
 def check_face():
-    global face_detected
-    return jsonify({"face_detected": face_detected})
+    return jsonify({"face_detected": hub.check_face()})
 
 @app.route("/open_camera", methods=["GET"])
 def open_camera():
-    global camera
     try:
-        if initialize_camera():
+        if hub.start():
             return jsonify({"status": "success", "message": "Camera opened"})
         else:
             return jsonify({"status": "error", "message": "Failed to initialize camera"})
@@ -142,16 +268,18 @@ def open_camera():
 
 @app.route("/capture_single_image", methods=["GET"])
 def capture_single_image():
-    global camera, captured_images, face_detected
-    if not initialize_camera():
+    global captured_images
+    if not hub.start():
         return jsonify({"status": "error", "message": "Camera not opened"})
 
-    if not face_detected:
+    if not hub.check_face():
         return jsonify({"status": "error", "message": "No face detected"})
 
     try:
-        # Capture a single frame
-        image = camera.capture_array()
+        # Take the frame the stream is showing rather than a second capture
+        image = hub.latest_frame()
+        if image is None:
+            return jsonify({"status": "error", "message": "No frame captured yet"})
         image_path = os.path.join(IMAGE_DIR, f"criminal_{int(time.time())}_{len(captured_images)+1}.jpg")
         cv2.imwrite(image_path, image)
         captured_images.append(image_path)
@@ -162,8 +290,8 @@ def capture_single_image():
 
 @app.route("/train_and_store", methods=["POST"])
 def train_and_store():
-    global camera, captured_images
-    if not initialize_camera():
+    global captured_images
+    if not hub.start():
         return jsonify({"status": "error", "message": "Camera not opened"})
 
     try:
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import pickle
+
+
+CACHE_VERSION = 1
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class TrainingCache:
+    def __init__(self, cache_path="training_cache.pickle", settings=None):
+        self.cache_path = cache_path
+        # Results are only valid for the detector/encoder settings that produced them
+        self.settings = tuple(sorted((settings or {}).items()))
+        self.files = {}
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = pickle.loads(f.read())
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"[INFO] Ignoring unreadable training cache: {e}")
+            return
+        if data.get("version") != CACHE_VERSION:
+            return
+        self.files = data["files"]
+        self.results = data["results"]
+
+    def digest(self, path):
+        # Re-hash only when size or mtime changed since the last run
+        st = os.stat(path)
+        known = self.files.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        digest = file_digest(path)
+        self.files[path] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def get(self, path):
+        result = self.results.get((self.digest(path), self.settings))
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, path, boxes, encodings):
+        self.results[(self.digest(path), self.settings)] = (boxes, encodings)
+
+    def prune(self, image_paths):
+        # Drop deleted images and any results no longer referenced by one
+        live = set(image_paths)
+        self.files = {p: v for p, v in self.files.items() if p in live}
+        keep = {(v[2], self.settings) for v in self.files.values()}
+        removed = len(self.results) - len(keep & self.results.keys())
+        self.results = {k: v for k, v in self.results.items() if k in keep}
+        return removed
+
+    def save(self):
+        data = {"version": CACHE_VERSION, "files": self.files, "results": self.results}
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pickle.dumps(data))
+        os.replace(tmp_path, self.cache_path)